@@ -0,0 +1,183 @@
+"""
+amoCRM OAuth Tokens
+
+Lazy, cached token handling for the import and lead-funnel scripts.
+Importing a script no longer configures tokens: configure_tokens()
+runs on first use (amo_executor.configure).
+
+Main features:
+- Credentials read from the environment once, on first use
+- Access token held in memory with its expiry (one JWT decode
+  per token instead of a file read and decode per request)
+- Proactive refresh REFRESH_AHEAD seconds before expiry
+- Token files re-read before refreshing, so a token refreshed
+  by another process (cron run, funnel service) is picked up
+- Atomic token file writes
+
+Usage:
+    python amo_auth.py --code <authorization code>   # once, to initialize OAuth
+"""
+
+import os
+import time
+import argparse
+import threading
+from pathlib import Path
+
+import jwt
+from amocrm.v2 import exceptions, tokens
+
+
+# ======================
+# CONFIGURATION
+# ======================
+
+# IMPORTANT:
+# Credentials must be stored in environment variables:
+# AMO_CLIENT_ID, AMO_CLIENT_SECRET, AMO_SUBDOMAIN, AMO_REDIRECT_URL
+
+# Directory of access_token.txt / refresh_token.txt
+TOKENS_DIR = Path(os.getenv("AMO_TOKENS_DIR", "."))
+
+# Refresh the access token this many seconds before it expires
+REFRESH_AHEAD = 300
+
+# Pause before retrying a failed early refresh
+REFRESH_RETRY = 30
+
+
+# ======================
+# STORAGE
+# ======================
+
+class AtomicFileTokensStorage(tokens.FileTokensStorage):
+    """
+    FileTokensStorage that writes through temp files,
+    so a concurrent reader never sees a half-written token.
+    """
+
+    def __init__(self, directory_path: Path | str = TOKENS_DIR):
+        super().__init__(str(directory_path))
+
+    @staticmethod
+    def _write_file(path: str, value: str):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(value)
+        os.replace(tmp, path)
+
+    def save_tokens(self, access_token: str, refresh_token: str):
+        # Refresh token first: a reader seeing the new access
+        # token must also find its matching refresh token
+        self._write_file(self._refresh_token_path, refresh_token)
+        self._write_file(self._access_token_path, access_token)
+
+
+# ======================
+# TOKEN MANAGER
+# ======================
+
+def token_expiry(token: str) -> float:
+    """
+    Expiry (Unix time) of a JWT access token.
+    """
+    return float(jwt.decode(token, options={"verify_signature": False})["exp"])
+
+
+class CachedTokenManager(tokens.TokenManager):
+    """
+    TokenManager that keeps the current access token in
+    memory and refreshes it ahead of expiry.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._reset_cache()
+
+    def _reset_cache(self):
+        # (token, time after which the storage is consulted again)
+        self._cached = (None, 0.0)
+        self._refresh_lock = threading.Lock()
+
+    def get_access_token(self) -> str:
+        token, refresh_at = self._cached
+        if token and time.time() < refresh_at:
+            return token
+
+        with self._refresh_lock:
+            token, refresh_at = self._cached
+            if token and time.time() < refresh_at:
+                return token
+
+            token = self._storage.get_access_token()
+            if not token:
+                raise exceptions.NoToken("Initialize tokens once: python amo_auth.py --code <code>")
+
+            expires_at = token_expiry(token)
+            refresh_at = expires_at - REFRESH_AHEAD
+
+            if time.time() >= refresh_at:
+                try:
+                    token, refresh_token = self._get_new_tokens()
+                    self._storage.save_tokens(token, refresh_token)
+                    expires_at = token_expiry(token)
+                    refresh_at = expires_at - REFRESH_AHEAD
+                    print("↻ amoCRM access token refreshed")
+                except Exception as e:
+                    if time.time() >= expires_at:
+                        raise
+                    # Still valid: keep using it and retry a bit later
+                    print(f"✗ Token refresh failed, current token expires in {expires_at - time.time():.0f}s: {e}")
+                    refresh_at = min(time.time() + REFRESH_RETRY, expires_at)
+
+            self._cached = (token, refresh_at)
+            return token
+
+
+_configure_lock = threading.Lock()
+
+
+def configure_tokens() -> CachedTokenManager:
+    """
+    Configures the shared amocrm token manager from the
+    environment. Idempotent; a storage installed before
+    (e.g. in-memory tokens in benchmarks) is kept.
+    """
+    manager = tokens.default_token_manager
+
+    with _configure_lock:
+        if isinstance(manager, CachedTokenManager):
+            return manager
+
+        # amocrm binds default_token_manager as a default argument of
+        # every interaction, so the shared instance is switched in place
+        manager.__class__ = CachedTokenManager
+        manager._reset_cache()
+
+        manager(
+            client_id=os.getenv("AMO_CLIENT_ID"),
+            client_secret=os.getenv("AMO_CLIENT_SECRET"),
+            subdomain=os.getenv("AMO_SUBDOMAIN"),
+            redirect_url=os.getenv("AMO_REDIRECT_URL"),
+            storage=AtomicFileTokensStorage(),
+        )
+
+    return manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Initialize amoCRM OAuth tokens")
+    parser.add_argument("--code", default=os.getenv("AMO_AUTH_CODE"),
+                        help="Authorization code (default: AMO_AUTH_CODE)")
+    args = parser.parse_args()
+
+    if not args.code:
+        parser.error("authorization code required (--code or AMO_AUTH_CODE)")
+
+    manager = configure_tokens()
+    manager.init(code=args.code)
+    print(f"✓ Tokens saved, access token valid for {token_expiry(manager.get_access_token()) - time.time():.0f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+amoCRM Entity Cache
+
+Per-run, bounded LRU cache of amoCRM entities keyed by
+entity type and ID. Entities are loaded on a miss and must
+be invalidated whenever the script writes to them.
+"""
+
+import threading
+from collections import OrderedDict
+
+# Maximum number of entities kept in memory
+CACHE_SIZE = 5000
+
+
+class EntityCache:
+    """
+    Thread-safe LRU cache of amoCRM model instances.
+    """
+
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(model, object_id) -> tuple:
+        return model.__name__, object_id
+
+    def get(self, model, object_id: int):
+        """
+        Returns the cached entity or fetches it with
+        model.objects.get() on a miss.
+        """
+        key = self._key(model, object_id)
+
+        with self._lock:
+            if key in self._items:
+                self.hits += 1
+                self._items.move_to_end(key)
+                return self._items[key]
+            self.misses += 1
+
+        entity = model.objects.get(object_id=object_id)
+        self.put(entity)
+        return entity
+
+    def put(self, entity):
+        """
+        Stores an entity that is already loaded.
+        """
+        key = self._key(type(entity), entity.id)
+
+        with self._lock:
+            self._items[key] = entity
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self, model, object_id: int):
+        """
+        Drops an entity after it was written to.
+        """
+        with self._lock:
+            self._items.pop(self._key(model, object_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,222 @@
+"""
+amoCRM Request Executor
+
+Shared request layer for the import and lead-funnel scripts.
+Runs amoCRM calls on a thread pool while keeping the total
+request rate inside the account quota.
+
+Main features:
+- Token-bucket limiter applied to every HTTP request
+- Automatic backoff on 429 / 5xx responses
+- Configurable worker count
+- Ordered results with per-item error reporting
+- Optional base URL override (AMO_BASE_URL) for local stub servers
+- OAuth tokens configured on first configure() call, not at import
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Tuple
+from urllib.parse import urlsplit
+
+from amocrm.v2 import interaction
+
+from amo_auth import configure_tokens
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# ======================
+# CONFIGURATION
+# ======================
+
+# amoCRM allows 7 requests per second per integration
+RATE_LIMIT = float(os.getenv("AMO_RATE_LIMIT", 7))
+
+# Number of threads issuing API calls
+WORKERS = int(os.getenv("AMO_WORKERS", 4))
+
+# Retries for throttled / failed requests
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Only these methods are retried on 5xx and dropped connections;
+# a failed POST may already have created the entity
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PATCH"})
+
+# Sends API requests to this origin instead of
+# https://<subdomain>.amocrm.ru (e.g. http://127.0.0.1:8001 for tests)
+BASE_URL = os.getenv("AMO_BASE_URL")
+
+
+# ======================
+# RATE LIMITING
+# ======================
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+    acquire() blocks until a request may be sent.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class AmoRetry(Retry):
+    """
+    Retries 429 for every method; 5xx, read errors and dropped
+    connections only for IDEMPOTENT_METHODS. Connect errors
+    (request never sent) are retried for all methods.
+    Every retry takes a token from the bucket, so retries
+    count against the quota.
+    """
+
+    def __init__(self, *args, bucket: TokenBucket | None = None, **kwargs):
+        kwargs.setdefault("allowed_methods", IDEMPOTENT_METHODS)
+        super().__init__(*args, **kwargs)
+        self.bucket = bucket
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.bucket = self.bucket
+        return retry
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429 and self.status_forcelist and 429 in self.status_forcelist:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        # Base Retry treats "other" errors as retryable for any method
+        if error and not self._is_connection_error(error) and (
+            method is None or not self._is_method_retryable(method)
+        ):
+            raise error.with_traceback(_stacktrace)
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.bucket is not None:
+            self.bucket.acquire()
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    HTTP adapter that takes a token before every request
+    and optionally redirects it to base_url.
+    """
+
+    def __init__(self, bucket: TokenBucket, base_url: str | None = None, **kwargs):
+        self._bucket = bucket
+        self._base_url = base_url.rstrip("/") if base_url else None
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self._base_url:
+            parts = urlsplit(request.url)
+            request.url = self._base_url + parts.path + (f"?{parts.query}" if parts.query else "")
+        self._bucket.acquire()
+        return super().send(request, **kwargs)
+
+
+def configure(rate: float = RATE_LIMIT, workers: int = WORKERS, base_url: str | None = BASE_URL) -> TokenBucket:
+    """
+    Installs the limiter and retry policy on the session
+    shared by all amoCRM models, and configures tokens.
+    """
+    configure_tokens()
+
+    bucket = TokenBucket(rate)
+
+    retry = AmoRetry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+        bucket=bucket,
+    )
+
+    adapter = RateLimitedAdapter(bucket, base_url, max_retries=retry, pool_maxsize=max(workers, 1))
+    interaction._session.mount("https://", adapter)
+    interaction._session.mount("http://", adapter)
+
+    return bucket
+
+
+# ======================
+# EXECUTOR
+# ======================
+
+class RequestExecutor:
+    """
+    Thread pool for amoCRM calls.
+
+    Usage:
+        with RequestExecutor(workers=4) as executor:
+            for item, result, error in executor.map(fn, items):
+                ...
+    """
+
+    def __init__(self, workers: int = WORKERS):
+        self.workers = max(workers, 1)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def submit(self, fn: Callable, *args, **kwargs):
+        return self._pool.submit(fn, *args, **kwargs)
+
+    def map(self, fn: Callable, items: Iterable) -> Iterator[Tuple[Any, Any, Exception | None]]:
+        """
+        Applies fn to every item and yields (item, result, error)
+        in input order. Keeps a bounded number of calls in flight,
+        so items may come from a lazy iterator.
+        """
+        in_flight = deque()
+
+        def drain_one():
+            item, future = in_flight.popleft()
+            try:
+                return item, future.result(), None
+            except Exception as e:
+                return item, None, e
+
+        for item in items:
+            in_flight.append((item, self._pool.submit(fn, item)))
+            if len(in_flight) >= self.workers * 2:
+                yield drain_one()
+
+        while in_flight:
+            yield drain_one()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
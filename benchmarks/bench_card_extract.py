@@ -0,0 +1,161 @@
+"""
+Card Extraction Benchmark
+
+Compares the lxml engine (card_extract) with the previous
+BeautifulSoup path on synthetic Yandex-like organization pages
+(large inline scripts and deep markup around the card), and
+times batch extraction of a directory in a process pool.
+
+Usage:
+    python benchmarks/bench_card_extract.py --pages 200 --size-mb 2
+"""
+
+import sys
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bs4 import BeautifulSoup
+
+from card_extract import extract_card, extract_directory
+from normalize import address_in_city, canonical_phone, compact_hours
+
+
+# ======================
+# PREVIOUS IMPLEMENTATION
+# ======================
+
+def bs4_working_hours(soup):
+    status = soup.select_one("div.business-working-status-view")
+    if status and "круглосуточ" in status.get_text(strip=True).lower():
+        return "24/7"
+    metas = soup.select("meta[itemprop='openingHours']")
+    if not metas:
+        return None
+    return compact_hours([m.get("content") for m in metas if m.get("content")])
+
+
+def bs4_extract(html, url, city, category, filter_address):
+    soup = BeautifulSoup(html, "lxml")
+    name_el = soup.select_one("h1")
+    addr_el = soup.select_one("div.business-contacts-view__address a")
+    phone_el = soup.select_one("div.orgpage-phones-view__phone-number")
+    site_el = soup.select_one("a.business-urls-view__link")
+
+    address_text = addr_el.get_text(strip=True) if addr_el else None
+    if filter_address and address_text and not address_in_city(address_text, city):
+        return None
+
+    return {
+        "Category": category,
+        "City": city,
+        "Name": name_el.get_text(strip=True) if name_el else None,
+        "Address": address_text,
+        "Phone": canonical_phone(phone_el.get_text(strip=True)) if phone_el else None,
+        "Website": site_el.get_text(strip=True) if site_el else None,
+        "Working Hours": bs4_working_hours(soup),
+        "URL": url
+    }
+
+
+# ======================
+# SYNTHETIC PAGES
+# ======================
+
+def make_page(i: int, size_mb: float, rng: random.Random) -> str:
+    """
+    Organization page of roughly size_mb: inline state
+    scripts and filler markup around the card blocks.
+    """
+    filler_block = "".join(
+        f'<div class="sidebar-item _id_{n}"><span class="label">Пункт {n}</span>'
+        f'<a class="link" href="/x/{n}">ссылка&nbsp;{n}</a></div>'
+        for n in range(50)
+    )
+    script = '<script type="application/json">{"state": "' + "x" * 20000 + '"}</script>'
+    unit = filler_block + script
+    repeats = max(int(size_mb * 1024 * 1024 / len(unit.encode("utf-8"))), 1)
+
+    around_the_clock = rng.random() < 0.2
+    status = "Круглосуточно" if around_the_clock else "Открыто до 21:00"
+    hours = "".join(
+        f'<meta itemprop="openingHours" content="{day} 09:00-21:00"/>'
+        for day in ("Mo", "Tu", "We", "Th", "Fr", "Sa", "Su")
+    )
+
+    card = (
+        f'<h1 class="orgpage-header-view__header"> Автомойка <span>№{i}</span> </h1>'
+        f'<div class="business-contacts-view__address"><div class="wrap">'
+        f'<a class="business-contacts-view__address-link" href="#">Москва, улица&nbsp;{i}, <b>д. 1</b></a>'
+        f'</div></div>'
+        f'<div class="orgpage-phones-view__phone-number"> +7 (495) 000-{i % 100:02d}-00 </div>'
+        f'<a class="business-urls-view__link" href="https://site{i}.ru">site{i}.ru</a>'
+        f'<div class="business-working-status-view _open">{status}<!-- tooltip --></div>'
+        f'{hours}'
+    )
+
+    half = repeats // 2
+    return (
+        f'<!DOCTYPE html><html><head><meta charset="utf-8"/>'
+        f'<link rel="canonical" href="https://yandex.ru/maps/org/{i}/"/>'
+        f'{script * 3}</head><body>'
+        f'{unit * half}<main><div class="card">{card}</div></main>{unit * (repeats - half)}'
+        f'</body></html>'
+    )
+
+
+def measure(fn, pages, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for url, html in pages:
+            fn(html, url, "Москва", "Автомойка", True)
+        best = min(best, time.perf_counter() - started)
+    return best / len(pages) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Card extraction benchmark")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--size-mb", type=float, default=2.0,
+                        help="Approximate size of each page")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes for the directory run (default: CPU count)")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    pages = [(f"https://yandex.ru/maps/org/{i}/", make_page(i, args.size_mb, rng)) for i in range(args.pages)]
+    size = sum(len(html) for _, html in pages) / len(pages) / 1024 / 1024
+
+    # Same rows from both engines
+    for url, html in pages[:20]:
+        expected = bs4_extract(html, url, "Москва", "Автомойка", True)
+        actual = extract_card(html, url, "Москва", "Автомойка", True)
+        assert actual == expected, (actual, expected)
+
+    print(f"{args.pages} pages, {size:.1f} MB each")
+
+    baseline = measure(bs4_extract, pages, args.repeat)
+    engine = measure(extract_card, pages, args.repeat)
+    print(f"BeautifulSoup        : {baseline:8.1f} ms/page")
+    print(f"card_extract (lxml)  : {engine:8.1f} ms/page  ({baseline / engine:.1f}x)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (_, html) in enumerate(pages):
+            Path(tmp, f"{i:05d}.html").write_text(html, encoding="utf-8")
+
+        for workers, label in ((1, "directory, 1 process "), (args.workers, "directory, pool      ")):
+            started = time.perf_counter()
+            rows = [row for _, row in extract_directory(tmp, "Москва", "Автомойка", True, workers=workers)]
+            elapsed = time.perf_counter() - started
+            assert len(rows) == args.pages and all(rows)
+            print(f"{label}: {elapsed / args.pages * 1000:8.1f} ms/page  ({args.pages / elapsed:.0f} pages/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Normalization Benchmark
+
+Compares per-row Python cleaning (scalar normalize.py functions
+applied cell by cell, and the previous address_matches that built
+its regex on every call) with the column versions over synthetic
+scraper output. Results of both paths are checked to be equal.
+
+Usage:
+    python benchmarks/bench_normalize.py --rows 1000000
+"""
+
+import re
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from normalize import (
+    address_in_city, canonical_phone, city_mask, compact_hours_text, normalize_frame,
+    website_column, website_domain,
+)
+
+
+CITIES = ["Москва", "Химки", "Санкт-Петербург", "Казань", "Екатеринбург"]
+
+
+# ======================
+# PREVIOUS IMPLEMENTATION
+# ======================
+
+def old_address_matches(address: str, city: str) -> bool:
+    return re.search(rf"\b{re.escape(city.lower())}\b", address.lower()) is not None
+
+
+# ======================
+# SYNTHETIC ROWS
+# ======================
+
+def make_frame(rows: int, seed: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    numbers = rng.integers(0, 10_000_000, rows)
+
+    phone_formats = [
+        lambda n: f"+7 (495) {n // 10000:03d}-{n // 100 % 100:02d}-{n % 100:02d}",
+        lambda n: f"8 495 {n:07d}",
+        lambda n: f"495{n:07d}",
+        lambda n: f"+7 (495) {n // 10000:03d}-{n % 10000:04d} доб. 12",
+        lambda n: float(f"7495{n:07d}"),
+    ]
+    phones = [phone_formats[n % 5](n) if n % 10 else None for n in numbers]
+
+    website_formats = [
+        lambda n: f"https://www.site{n}.ru/contacts?utm=1",
+        lambda n: f"site{n}.ru",
+        lambda n: f"http://vk.com/wash{n}/",
+        lambda n: f"HTTPS://Site{n}.com:8080/#top",
+    ]
+    websites = [website_formats[n % 4](n) if n % 3 else None for n in numbers]
+
+    weekdays = "; ".join(f"{d} 09:00-21:00" for d in ("Mon", "Tue", "Wed", "Thu", "Fri"))
+    hours_values = [
+        weekdays + "; Sat 10:00-18:00; Sun 10:00-18:00",
+        "; ".join(f"{d} 08:00-22:00" for d in ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")),
+        "24/7",
+        None,
+    ]
+    hours = [hours_values[n % 4] for n in numbers]
+
+    cities = [CITIES[n % len(CITIES)] for n in numbers]
+    address_cities = [CITIES[n % len(CITIES)] if n % 7 else "Московская область" for n in numbers]
+    addresses = [f"{c}, улица Ленина, {n % 200}" for c, n in zip(address_cities, numbers)]
+
+    return pd.DataFrame({
+        "City": cities,
+        "Address": addresses,
+        "Phone": phones,
+        "Website": websites,
+        "Working Hours": hours,
+    })
+
+
+# ======================
+# RUNS
+# ======================
+
+def per_row(df: pd.DataFrame):
+    phones = [canonical_phone(v) for v in df["Phone"]]
+    websites = [website_domain(v) for v in df["Website"]]
+    hours = [compact_hours_text(v) for v in df["Working Hours"]]
+    return phones, websites, hours
+
+
+def per_column(df: pd.DataFrame):
+    return normalize_frame(df), website_column(df["Website"])
+
+
+def per_row_cities(df: pd.DataFrame, matches):
+    return [matches(a, c) for a, c in zip(df["Address"], df["City"])]
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def as_list(values: pd.Series) -> list:
+    return values.astype(object).where(values.notna(), None).tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalization benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df, elapsed = timed(make_frame, args.rows)
+    print(f"{args.rows:,} rows generated in {elapsed:.1f}s")
+
+    (phones, websites, hours), row_time = timed(per_row, df)
+    (frame, domains), frame_time = timed(per_column, df)
+
+    assert as_list(frame["Phone"]) == phones
+    assert as_list(frame["Website"]) == [v and v.strip() for v in as_list(df["Website"])]
+    assert as_list(domains) == websites
+    assert as_list(frame["Working Hours"]) == hours
+
+    old_cities, old_city_time = timed(per_row_cities, df, old_address_matches)
+    row_cities, row_city_time = timed(per_row_cities, df, address_in_city)
+    mask, mask_time = timed(city_mask, df["Address"], df["City"])
+
+    assert mask.tolist() == row_cities == old_cities
+
+    def line(label, seconds, baseline):
+        print(f"{label:<36}: {seconds:7.2f}s  ({args.rows / seconds / 1e6:5.2f}M rows/s, {baseline / seconds:4.1f}x)")
+
+    line("phone/website/hours, per row", row_time, row_time)
+    line("phone/website/hours, column versions", frame_time, row_time)
+    line("city match, regex per call (old)", old_city_time, old_city_time)
+    line("city match, cached pattern per row", row_city_time, old_city_time)
+    line("city match, city_mask", mask_time, old_city_time)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Startup Benchmark
+
+Measures what a short cron run pays before doing any work:
+- import time of each script, in a fresh interpreter, and a
+  check that importing no longer configures amoCRM tokens
+- access token lookup per API request: stock TokenManager
+  (file read + JWT decode every call) vs amo_auth's cached manager
+- chromedriver resolution from the on-disk cache; with --driver,
+  also the webdriver_manager lookup it replaces (needs network)
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --driver
+"""
+
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import jwt
+from amocrm.v2 import tokens
+
+import amo_auth
+
+
+MODULES = ("excel_import", "lead_creation_funnel_attribution", "funnel_service", "yandex_maps_parsing")
+
+IMPORT_PROBE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+from amocrm.v2 import tokens
+print(elapsed, tokens.default_token_manager._storage is not None)
+"""
+
+
+def report(label: str, text: str):
+    print(f"{label:<42}: {text}")
+
+
+# ======================
+# IMPORTS
+# ======================
+
+def import_time(module: str, repeat: int) -> tuple:
+    """
+    Median import time of a module in a fresh process and
+    whether the import configured a token storage.
+    """
+    times, configured = [], False
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE.format(module=module)],
+            cwd=tempfile.gettempdir(), env={"PYTHONPATH": str(ROOT), "PATH": ""},
+            capture_output=True, text=True, check=True,
+        ).stdout.split()
+        times.append(float(out[0]))
+        configured |= out[1] == "True"
+    return statistics.median(times), configured
+
+
+# ======================
+# TOKENS
+# ======================
+
+def token_lookups(manager: tokens.TokenManager, calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        manager.get_access_token()
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def bench_tokens(calls: int):
+    token = jwt.encode({"exp": int(time.time()) + 86400}, "benchmark-secret-key-32-bytes-long")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = amo_auth.AtomicFileTokensStorage(tmp)
+        storage.save_tokens(token, "refresh")
+
+        stock = tokens.TokenManager()
+        stock(client_id="id", client_secret="secret", subdomain="bench", redirect_url="", storage=storage)
+
+        cached = amo_auth.CachedTokenManager()
+        cached(client_id="id", client_secret="secret", subdomain="bench", redirect_url="", storage=storage)
+
+        baseline = token_lookups(stock, calls)
+        fast = token_lookups(cached, calls)
+
+    report("token per request, stock manager", f"{baseline:8.2f} µs")
+    report("token per request, cached manager", f"{fast:8.2f} µs  ({baseline / fast:.0f}x)")
+
+
+# ======================
+# DRIVER
+# ======================
+
+def bench_driver(lookup: bool):
+    import yandex_maps_parsing as scraper
+
+    if scraper.CHROMEDRIVER_PATH:
+        print("chromedriver pinned by CHROMEDRIVER_PATH, no resolution")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fake_driver = Path(tmp, "chromedriver")
+        fake_driver.write_text("")
+        scraper.DRIVER_CACHE_PATH = Path(tmp, "chromedriver.json")
+        scraper.DRIVER_CACHE_PATH.write_text(
+            f'{{"path": "{fake_driver}", "version": null, "resolved_at": {time.time()}}}'
+        )
+        scraper.CHROMEDRIVER_VERSION = None
+
+        started = time.perf_counter()
+        assert scraper.chromedriver_path() == str(fake_driver)
+        from_disk = time.perf_counter() - started
+
+        started = time.perf_counter()
+        scraper.chromedriver_path()
+        in_process = time.perf_counter() - started
+
+    report("chromedriver, disk cache", f"{from_disk * 1000:8.2f} ms")
+    report("chromedriver, later workers", f"{in_process * 1000:8.3f} ms")
+
+    if lookup:
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        started = time.perf_counter()
+        ChromeDriverManager().install()
+        report("chromedriver, webdriver_manager", f"{(time.perf_counter() - started) * 1000:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Script startup benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--calls", type=int, default=20000, help="Token lookups per manager")
+    parser.add_argument("--driver", action="store_true",
+                        help="Also time webdriver_manager's lookup (network)")
+    args = parser.parse_args()
+
+    for module in MODULES:
+        seconds, configured = import_time(module, args.repeat)
+        note = "tokens configured on import!" if configured else "no token setup"
+        report(f"import {module}", f"{seconds * 1000:8.1f} ms  ({note})")
+
+    bench_tokens(args.calls)
+    bench_driver(args.driver)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+Fake amoCRM API
+
+In-memory stand-in for the amoCRM v4 endpoints used by
+excel_import and lead_creation_funnel_attribution, for
+offline benchmarks and tests. Point the scripts at it with
+AMO_BASE_URL=http://127.0.0.1:<port>.
+
+Features:
+- Companies, contacts, leads and company tags with links
+- Paged lists with filter[id], filter[tags], filter[name]
+  and filter[updated_at] support
+- Bulk POST / PATCH with request_id echo, contacts/link
+- Configurable latency, rate limit (429 above N req/s),
+  random 429 injection and maximum page size
+- Request statistics per endpoint
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+ENTITIES = ("companies", "contacts", "leads")
+
+_PATH_RE = re.compile(r"^/api/v4/(companies/tags|companies|contacts/link|contacts|leads)(?:/(\d+))?/?$")
+
+
+class FakeAmo:
+    """
+    Usage:
+        amo = FakeAmo(latency=0.02, rate_limit=50)
+        amo.seed(1000, tag="yandex_car_washing")
+        base_url = amo.start()
+        ...
+        print(amo.stats())
+        amo.stop()
+    """
+
+    def __init__(self, latency: float = 0.0, rate_limit: float | None = None,
+                 error_rate: float = 0.0, page_size: int = 250, seed: int = 1):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.page_size = page_size
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = deque()
+        self._server = None
+        self.reset()
+
+    # ---------- data ----------
+
+    def reset(self):
+        """
+        Clears all entities and statistics.
+        """
+        with self._lock:
+            self.store = {name: {} for name in ENTITIES}
+            self.tags = {}
+            self._next_id = 1
+            self.reset_stats()
+
+    def reset_stats(self):
+        self.requests = Counter()
+        self.throttled = 0
+        self.started_at = time.monotonic()
+
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def _tag(self, name: str) -> dict:
+        for tag in self.tags.values():
+            if tag["name"] == name:
+                return tag
+        tag = {"id": self._new_id(), "name": name}
+        self.tags[tag["id"]] = tag
+        return tag
+
+    def seed(self, companies: int, tag: str, pipeline_id: int = 1, status_id: int = 1,
+             contact_ratio: float = 0.5, lead_ratio: float = 0.6, in_stage_ratio: float = 0.5,
+             url_field_id: int = 964013):
+        """
+        Adds tagged companies; some get a linked contact and
+        an open lead, part of those already in the target stage.
+        """
+        with self._lock:
+            now = int(time.time())
+            tag_ref = self._tag(tag)
+
+            for i in range(companies):
+                company_id = self._new_id()
+                company = {
+                    "id": company_id,
+                    "name": f"Company {i}",
+                    "responsible_user_id": 1,
+                    "updated_at": now,
+                    "custom_fields_values": [
+                        {"field_id": url_field_id, "values": [{"value": f"https://yandex.ru/maps/org/{i}/"}]},
+                        {"field_code": "PHONE", "values": [{"value": f"+7495{i:07d}", "enum_code": "WORK"}]},
+                    ],
+                    "_embedded": {"tags": [dict(tag_ref)], "contacts": [], "leads": []},
+                }
+                self.store["companies"][company_id] = company
+
+                if self._rng.random() < contact_ratio:
+                    contact_id = self._new_id()
+                    self.store["contacts"][contact_id] = {
+                        "id": contact_id, "name": company["name"], "updated_at": now,
+                        "_embedded": {"companies": [{"id": company_id}]},
+                    }
+                    company["_embedded"]["contacts"].append({"id": contact_id})
+
+                if self._rng.random() < lead_ratio:
+                    in_stage = self._rng.random() < in_stage_ratio
+                    lead_id = self._new_id()
+                    self.store["leads"][lead_id] = {
+                        "id": lead_id, "name": f"Deal {i}", "updated_at": now,
+                        "pipeline_id": pipeline_id,
+                        "status_id": status_id if in_stage else status_id + 1,
+                        "_embedded": {"companies": [{"id": company_id}]},
+                    }
+                    company["_embedded"]["leads"].append({"id": lead_id})
+
+    # ---------- server ----------
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Serves in a background thread; returns the base URL.
+        """
+        handler = type("Handler", (_Handler,), {"amo": self})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started_at
+        total = sum(self.requests.values())
+        return {
+            "requests": total,
+            "throttled_429": self.throttled,
+            "requests_per_s": round(total / elapsed, 2) if elapsed else None,
+            "by_endpoint": dict(self.requests.most_common()),
+        }
+
+    # ---------- request handling ----------
+
+    def _admit(self) -> bool:
+        """
+        Applies the rate limit and 429 injection.
+        """
+        with self._lock:
+            if self.error_rate and self._rng.random() < self.error_rate:
+                self.throttled += 1
+                return False
+
+            if self.rate_limit:
+                now = time.monotonic()
+                while self._recent and now - self._recent[0] >= 1:
+                    self._recent.popleft()
+                if len(self._recent) >= self.rate_limit:
+                    self.throttled += 1
+                    return False
+                self._recent.append(now)
+
+        return True
+
+    def handle(self, method: str, path: str, query: dict, body) -> tuple:
+        """
+        Returns (status, response body or None).
+        """
+        match = _PATH_RE.match(path)
+        if not match:
+            return 404, {"detail": "Not found"}
+
+        entity, object_id = match.group(1), match.group(2)
+
+        with self._lock:
+            self.requests[f"{method} {entity}{'/{id}' if object_id else ''}"] += 1
+
+            if method == "GET" and object_id:
+                data = self.store.get(entity, {}).get(int(object_id))
+                return (200, data) if data else (204, None)
+            if method == "GET":
+                # Empty pages are 204 No Content, like the real API
+                data = self._list(entity, query)
+                return (200, data) if data else (204, None)
+            if method == "POST" and entity == "contacts/link":
+                return 200, self._link(body)
+            if method == "POST" and entity in ENTITIES:
+                return 200, self._create(entity, body)
+            if method == "PATCH" and entity in ENTITIES:
+                return self._update(entity, body)
+
+        return 405, {"detail": "Method not allowed"}
+
+    def _list(self, entity: str, query: dict) -> dict | None:
+        field = "tags" if entity == "companies/tags" else entity
+        items = list(self.tags.values()) if field == "tags" else list(self.store[entity].values())
+
+        if "filter[id][]" in query:
+            ids = {int(v) for v in query["filter[id][]"]}
+            items = [item for item in items if item["id"] in ids]
+        if "filter[tags][]" in query:
+            tag_ids = {int(v) for v in query["filter[tags][]"]}
+            items = [
+                item for item in items
+                if any(tag["id"] in tag_ids for tag in item["_embedded"].get("tags", []))
+            ]
+        if "filter[name]" in query:
+            name = query["filter[name]"][0].lower()
+            items = [item for item in items if name in item["name"].lower()]
+        if "filter[updated_at][from]" in query:
+            low = int(query["filter[updated_at][from]"][0])
+            high = int(query.get("filter[updated_at][to]", [2 ** 40])[0])
+            items = [item for item in items if low <= item.get("updated_at", 0) <= high]
+
+        limit = min(int(query.get("limit", [250])[0]), self.page_size)
+        page = int(query.get("page", [1])[0])
+        chunk = items[(page - 1) * limit:page * limit]
+
+        if not chunk:
+            return None
+
+        response = {"_page": page, "_embedded": {field: chunk}, "_links": {}}
+        if page * limit < len(items):
+            response["_links"]["next"] = {"href": f"?page={page + 1}"}
+        return response
+
+    def _create(self, entity: str, items: list) -> dict:
+        now = int(time.time())
+        created = []
+
+        for item in items:
+            object_id = self._new_id()
+            data = {k: v for k, v in item.items() if k not in ("request_id", "_embedded")}
+            data.update(id=object_id, updated_at=now)
+            embedded = item.get("_embedded") or {}
+            data["_embedded"] = {
+                "tags": [self._tag(tag["name"]) for tag in embedded.get("tags", [])],
+                "companies": [], "contacts": [], "leads": [],
+            }
+            self.store[entity][object_id] = data
+
+            # Leads created with embedded companies / contacts
+            for link_type in ("companies", "contacts"):
+                for ref in embedded.get(link_type, []):
+                    linked = self.store[link_type].get(ref["id"])
+                    if linked is not None:
+                        linked["_embedded"].setdefault(entity, []).append({"id": object_id})
+                        linked["updated_at"] = now
+                        data["_embedded"][link_type].append({"id": ref["id"]})
+
+            result = {"id": object_id}
+            if "request_id" in item:
+                result["request_id"] = item["request_id"]
+            created.append(result)
+
+        return {"_embedded": {entity: created}}
+
+    def _update(self, entity: str, items: list) -> tuple:
+        now = int(time.time())
+
+        missing = [str(i) for i, item in enumerate(items) if item.get("id") not in self.store[entity]]
+        if missing:
+            return 400, {"validation-errors": [
+                {"request_id": i, "errors": [{"path": "id", "detail": "Entity not found"}]} for i in missing
+            ]}
+
+        for item in items:
+            data = self.store[entity][item["id"]]
+            data.update({k: v for k, v in item.items() if k != "_embedded"}, updated_at=now)
+
+        return 200, {"_embedded": {entity: [{"id": item["id"]} for item in items]}}
+
+    def _link(self, links: list) -> dict:
+        now = int(time.time())
+
+        for link in links:
+            contact = self.store["contacts"].get(link["entity_id"])
+            target = self.store.get(link["to_entity_type"], {}).get(link["to_entity_id"])
+            if contact is None or target is None:
+                continue
+            contact["_embedded"].setdefault(link["to_entity_type"], []).append({"id": target["id"]})
+            target["_embedded"].setdefault("contacts", []).append({"id": contact["id"]})
+            target["updated_at"] = now
+
+        return {"_embedded": {"links": links}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    amo: FakeAmo = None
+    protocol_version = "HTTP/1.1"
+
+    def _serve(self, method: str):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+
+        if self.amo.latency:
+            time.sleep(self.amo.latency)
+
+        if not self.amo._admit():
+            self._reply(429, {"title": "Too Many Requests"})
+            return
+
+        url = urlsplit(self.path)
+        status, response = self.amo.handle(method, url.path, parse_qs(url.query), body)
+        self._reply(status, response)
+
+    def _reply(self, status: int, response):
+        payload = json.dumps(response).encode("utf-8") if response is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/hal+json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._serve("GET")
+
+    def do_POST(self):
+        self._serve("POST")
+
+    def do_PATCH(self):
+        self._serve("PATCH")
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,274 @@
+"""
+Offline Benchmark Harness
+
+Runs excel_import and lead_creation_funnel_attribution against
+a local fake amoCRM server (benchmarks/fake_amo.py) and reports
+requests made, wall time, requests/sec and peak RSS per scenario.
+Results are written to a JSON file for comparison between versions.
+
+Every scenario runs in its own process with a freshly seeded
+server, so timings and memory are not shared between them.
+
+Scenarios:
+- import   import_companies_from_excel on a synthetic CSV
+           (part of the rows already exist in CRM)
+- funnel   full lead_creation_funnel_attribution pass
+
+Usage:
+    python benchmarks/run_benchmarks.py --companies 2000 --latency 0.02
+    python benchmarks/run_benchmarks.py --rate-limit 7 --error-rate 0.02 -o before.json
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_amo import FakeAmo
+
+
+SCENARIOS = ("import", "funnel")
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Funnel settings, mirrored from lead_creation_funnel_attribution
+TAG_NAME = "yandex_car_washing"
+PIPELINE_ID = 8397118
+STATUS_ID = 68374590
+
+# Share of import rows that match companies already in CRM
+DUPLICATE_RATIO = 0.2
+
+
+# ======================
+# CHILD PROCESS
+# ======================
+
+def _fake_tokens():
+    """
+    Installs an in-memory token that never expires,
+    so no OAuth call is made.
+    """
+    import jwt
+    from amocrm.v2 import tokens
+
+    storage = tokens.MemoryTokensStorage()
+    storage.save_tokens(jwt.encode({"exp": int(time.time()) + 86400}, "benchmark-secret-key-32-bytes-long"), "refresh")
+    tokens.default_token_manager._storage = storage
+
+
+def run_child(scenario: str, input_path: str | None, result_path: str):
+    """
+    Runs one scenario in this process and writes
+    {"wall_s", "peak_rss_mb"} to result_path.
+    """
+    _fake_tokens()
+
+    started = time.perf_counter()
+
+    if scenario == "import":
+        import excel_import
+        excel_import.import_companies_from_excel(input_path, refresh_index=True)
+    elif scenario == "funnel":
+        import lead_creation_funnel_attribution as funnel
+        sys.argv = ["funnel"]
+        funnel.main()
+    else:
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+    wall = time.perf_counter() - started
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+    Path(result_path).write_text(json.dumps({"wall_s": wall, "peak_rss_mb": rss_mb}))
+
+
+# ======================
+# SCENARIO SETUP
+# ======================
+
+def write_import_input(path: Path, rows: int, existing: int):
+    """
+    Synthetic scraper output; the first DUPLICATE_RATIO of
+    the rows reuse URLs of seeded companies.
+    """
+    from crm_schema import SCRAPED_COLUMNS
+
+    duplicates = min(int(rows * DUPLICATE_RATIO), existing)
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=SCRAPED_COLUMNS)
+        writer.writeheader()
+        for i in range(rows):
+            n = i if i < duplicates else existing + i
+            writer.writerow({
+                "Category": "Автомойка",
+                "City": "Москва",
+                "Name": f"Company {n}",
+                "Address": f"Москва, улица {n}",
+                "Phone": f"+7495{n:07d}",
+                "Website": f"https://site{n}.ru",
+                "Working Hours": "Mon-Sun: 09:00-21:00",
+                "URL": f"https://yandex.ru/maps/org/{n}/",
+            })
+
+
+def run_scenario(scenario: str, amo: FakeAmo, base_url: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        amo.reset()
+        amo.seed(args.companies, TAG_NAME, PIPELINE_ID, STATUS_ID)
+
+        input_path = None
+        if scenario == "import":
+            input_path = tmp / "input.csv"
+            write_import_input(input_path, args.rows, args.companies)
+
+        result_path = tmp / "result.json"
+        env = {
+            **os.environ,
+            "AMO_BASE_URL": base_url,
+            "AMO_SUBDOMAIN": "benchmark",
+            "AMO_RATE_LIMIT": str(args.client_rate),
+            "AMO_WORKERS": str(args.workers),
+        }
+
+        command = [sys.executable, str(Path(__file__).resolve()), "--child", scenario, "--result", str(result_path)]
+        if input_path:
+            command += ["--input", str(input_path)]
+
+        amo.reset_stats()
+
+        # Scripts print per entity; only keep the tail of the log for errors
+        log_path = tmp / "output.log"
+        with open(log_path, "w") as log:
+            process = subprocess.run(command, cwd=tmp, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+        stats = amo.stats()
+
+        if process.returncode != 0 or not result_path.exists():
+            tail = log_path.read_text(errors="replace").splitlines()[-20:]
+            return {"error": f"exit code {process.returncode}", "log_tail": tail}
+
+        measured = json.loads(result_path.read_text())
+
+    return {
+        "wall_s": round(measured["wall_s"], 3),
+        "requests": stats["requests"],
+        "requests_per_s": round(stats["requests"] / measured["wall_s"], 2) if measured["wall_s"] else None,
+        "throttled_429": stats["throttled_429"],
+        "peak_rss_mb": round(measured["peak_rss_mb"], 1),
+        "by_endpoint": stats["by_endpoint"],
+    }
+
+
+def git_version() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ======================
+# MAIN
+# ======================
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline amoCRM benchmarks against a fake API server")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--companies", type=int, default=1000,
+                        help="Tagged companies seeded in the fake CRM")
+    parser.add_argument("--rows", type=int, default=1000,
+                        help="Rows in the import input")
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="Server latency per request, seconds")
+    parser.add_argument("--rate-limit", type=float, default=50,
+                        help="Server-side requests per second before 429 (0 = off)")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Share of requests answered with an injected 429")
+    parser.add_argument("--page-size", type=int, default=250,
+                        help="Largest list page the server returns")
+    parser.add_argument("--client-rate", type=float, default=45,
+                        help="Client-side rate limit (AMO_RATE_LIMIT)")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Client worker threads (AMO_WORKERS)")
+    parser.add_argument("-o", "--output", help="Result JSON file (default: benchmarks/results/<version>_<time>.json)")
+
+    # Internal: run a single scenario in this process
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--input", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.input, args.result)
+        return
+
+    amo = FakeAmo(
+        latency=args.latency,
+        rate_limit=args.rate_limit or None,
+        error_rate=args.error_rate,
+        page_size=args.page_size,
+    )
+    base_url = amo.start()
+
+    version = git_version()
+    report = {
+        "version": version,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "config": {
+            key: getattr(args, key)
+            for key in ("companies", "rows", "latency", "rate_limit", "error_rate",
+                        "page_size", "client_rate", "workers")
+        },
+        "results": {},
+    }
+
+    try:
+        for scenario in args.scenarios:
+            print(f"Running {scenario}...")
+            result = run_scenario(scenario, amo, base_url, args)
+            report["results"][scenario] = result
+
+            if "error" in result:
+                print(f"  ✗ {result['error']}")
+                print("\n".join(f"    {line}" for line in result["log_tail"]))
+            else:
+                print(f"  {result['wall_s']:.2f}s, {result['requests']} requests "
+                      f"({result['requests_per_s']}/s), {result['throttled_429']} throttled, "
+                      f"{result['peak_rss_mb']} MB peak RSS")
+    finally:
+        amo.stop()
+
+    if args.output:
+        output = Path(args.output)
+    else:
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = RESULTS_DIR / f"{version or 'unknown'}_{stamp}.json"
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
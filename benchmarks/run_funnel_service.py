@@ -0,0 +1,220 @@
+"""
+Funnel Service Check
+
+Drives funnel_service.FunnelService against the fake amoCRM
+server (benchmarks/fake_amo.py) with synthetic form-encoded
+company webhooks, then checks the resulting CRM state and
+reports latency and requests made.
+
+Webhooks arrive as a steady stream with repeat events for the
+same companies, so the worker queue never runs dry. Afterwards
+every tagged company must have exactly one contact and one open
+lead in the target stage, and companies without the tag must be
+untouched. Malformed payloads must be rejected with 400.
+With --link-failures, the first contacts/link calls fail and
+the affected companies must be retried rather than marked done.
+
+Usage:
+    python benchmarks/run_funnel_service.py --companies 200 --rounds 3
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+from urllib.parse import urlencode
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_amo import FakeAmo
+
+
+# Funnel settings, mirrored from lead_creation_funnel_attribution
+TAG_NAME = "yandex_car_washing"
+PIPELINE_ID = 8397118
+STATUS_ID = 68374590
+
+# Companies per webhook request
+WEBHOOK_BATCH = 10
+
+
+# ======================
+# WEBHOOKS
+# ======================
+
+def webhook_body(company_ids, tag: str | None = TAG_NAME, action: str = "update") -> bytes:
+    fields = {}
+    for i, company_id in enumerate(company_ids):
+        fields[f"companies[{action}][{i}][id]"] = str(company_id)
+        fields[f"companies[{action}][{i}][name]"] = f"Company {company_id}"
+        if tag:
+            fields[f"companies[{action}][{i}][tags][0][name]"] = tag
+    return urlencode(fields).encode("utf-8")
+
+
+def post(url: str, body: bytes) -> int:
+    request = urllib.request.Request(
+        url, data=body, headers={"Content-Type": "application/x-www-form-urlencoded"}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def fail_links(amo: FakeAmo, failures: int):
+    """
+    Makes the first contacts/link requests answer 500.
+    """
+    handle = amo.handle
+    remaining = [failures]
+
+    def failing(method, path, query, body):
+        if method == "POST" and path.endswith("contacts/link") and remaining[0] > 0:
+            remaining[0] -= 1
+            return 500, {"detail": "Injected failure"}
+        return handle(method, path, query, body)
+
+    amo.handle = failing
+
+
+# ======================
+# CHECKS
+# ======================
+
+def check_state(amo: FakeAmo, tagged: list, untagged: list) -> list:
+    problems = []
+
+    with amo._lock:
+        for company_id in tagged:
+            company = amo.store["companies"][company_id]
+            contacts = company["_embedded"].get("contacts") or []
+            leads = [amo.store["leads"][link["id"]] for link in company["_embedded"].get("leads") or []]
+            in_stage = [
+                lead for lead in leads
+                if lead.get("pipeline_id") == PIPELINE_ID and lead.get("status_id") == STATUS_ID
+            ]
+
+            if len(contacts) != 1:
+                problems.append(f"company {company_id}: {len(contacts)} contacts")
+            if len(leads) != 1 or len(in_stage) != 1:
+                problems.append(f"company {company_id}: {len(leads)} leads, {len(in_stage)} in stage")
+
+        for company_id in untagged:
+            company = amo.store["companies"][company_id]
+            if company["_embedded"].get("contacts") or company["_embedded"].get("leads"):
+                problems.append(f"untagged company {company_id} was processed")
+
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Funnel webhook service against a fake amoCRM")
+    parser.add_argument("--companies", type=int, default=200,
+                        help="Tagged companies seeded in the fake CRM")
+    parser.add_argument("--rounds", type=int, default=3,
+                        help="Update events sent per company")
+    parser.add_argument("--interval", type=float, default=0.05,
+                        help="Pause between webhook requests, seconds")
+    parser.add_argument("--latency", type=float, default=0.005,
+                        help="Fake server latency per request, seconds")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--delay", type=float, default=0.2,
+                        help="Coalescing delay of the service, seconds")
+    parser.add_argument("--timeout", type=float, default=120,
+                        help="Longest wait for the queue to drain, seconds")
+    parser.add_argument("--link-failures", type=int, default=0,
+                        help="contacts/link requests answered with 500")
+    args = parser.parse_args()
+
+    amo = FakeAmo(latency=args.latency)
+    amo.seed(args.companies, TAG_NAME, PIPELINE_ID, STATUS_ID)
+    untagged = [amo._new_id() for _ in range(3)]
+    for company_id in untagged:
+        amo.store["companies"][company_id] = {
+            "id": company_id, "name": f"Other {company_id}", "updated_at": int(time.time()),
+            "_embedded": {"tags": [], "contacts": [], "leads": []},
+        }
+    tagged = [i for i in amo.store["companies"] if i not in untagged]
+
+    if args.link_failures:
+        fail_links(amo, args.link_failures)
+
+    base_url = amo.start()
+    os.environ.update({"AMO_BASE_URL": base_url, "AMO_SUBDOMAIN": "benchmark", "AMO_RATE_LIMIT": "100"})
+
+    from run_benchmarks import _fake_tokens
+    _fake_tokens()
+
+    # Imported after AMO_BASE_URL is set: amo_executor reads it on import
+    import funnel_service
+    funnel_service.COALESCE_DELAY = args.delay
+    funnel_service.RETRY_DELAY = 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        service = funnel_service.FunnelService("127.0.0.1", 0, args.workers, Path(tmp) / "events.sqlite3")
+        service.start()
+        amo.reset_stats()
+
+        try:
+            statuses = {
+                "malformed id": post(service.url, b"companies[update][0][id]=abc"),
+                "bad tag": post(service.url, webhook_body(untagged, tag="other")),
+                "no tag list": post(service.url, webhook_body(untagged, tag=None)),
+            }
+
+            started = time.monotonic()
+            for _ in range(args.rounds):
+                for i in range(0, len(tagged), WEBHOOK_BATCH):
+                    status = post(service.url, webhook_body(tagged[i:i + WEBHOOK_BATCH]))
+                    if status != 200:
+                        statuses.setdefault("update", status)
+                    time.sleep(args.interval)
+            sent = time.monotonic() - started
+
+            deadline = time.monotonic() + args.timeout
+            while time.monotonic() < deadline:
+                queued, failed = service.events.counts()
+                if queued == 0:
+                    break
+                time.sleep(0.1)
+            drained = time.monotonic() - started
+        finally:
+            stop = threading.Thread(target=service.stop)
+            stop.start()
+            stop.join()
+
+    stats = amo.stats()
+    amo.stop()
+
+    problems = check_state(amo, tagged, untagged)
+    if statuses.pop("malformed id") != 400:
+        problems.append("malformed company id was not rejected with 400")
+    problems += [f"webhook '{name}' answered {status}" for name, status in statuses.items() if status != 200]
+    if queued or failed:
+        problems.append(f"queue not drained: {queued} queued, {failed} failed")
+
+    print(f"{len(tagged)} companies, {args.rounds} events each over {sent:.1f}s; "
+          f"queue drained {drained - sent:.1f}s after the last webhook")
+    print(f"{stats['requests']} requests, {stats['throttled_429']} throttled")
+    for endpoint, count in sorted(stats["by_endpoint"].items()):
+        print(f"  {endpoint:<22} {count}")
+
+    if problems:
+        print(f"✗ {len(problems)} problem(s):")
+        for problem in problems[:20]:
+            print(f"  {problem}")
+        sys.exit(1)
+
+    print("✓ Every tagged company has one contact and one open lead in stage")
+
+
+if __name__ == "__main__":
+    main()
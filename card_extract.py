@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+"""
+Card Extraction Engine
+
+Extracts organization data from Yandex Maps card pages with
+lxml and precompiled XPath expressions, without building a
+BeautifulSoup tree. Returns the same row dicts as the scraper.
+
+Features:
+- One lxml parse per page, selectors compiled once
+- Text extraction matching BeautifulSoup get_text(strip=True)
+- Phone and hours normalized as in normalize.py
+- Batch extraction of saved HTML pages in a process pool
+
+Usage:
+    python card_extract.py saved_pages/ --city Москва --category Автомойка -o rows.csv
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Tuple
+
+import lxml.html
+from lxml import etree
+
+from normalize import address_in_city, canonical_phone, compact_hours
+
+
+# =============================
+# SELECTORS
+# =============================
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+NAME_XPATH = etree.XPath("(//h1)[1]")
+ADDRESS_BLOCK_XPATH = etree.XPath(f"(//div[{_has_class('business-contacts-view__address')}])[1]")
+ADDRESS_XPATH = etree.XPath(f"(//div[{_has_class('business-contacts-view__address')}]//a)[1]")
+PHONE_XPATH = etree.XPath(f"(//div[{_has_class('orgpage-phones-view__phone-number')}])[1]")
+SITE_XPATH = etree.XPath(f"(//a[{_has_class('business-urls-view__link')}])[1]")
+STATUS_XPATH = etree.XPath(f"(//div[{_has_class('business-working-status-view')}])[1]")
+HOURS_XPATH = etree.XPath("//meta[@itemprop='openingHours']/@content")
+CANONICAL_XPATH = etree.XPath("(//link[@rel='canonical']/@href | //meta[@property='og:url']/@content)[1]")
+
+# Text nodes as seen by get_text(): comments, scripts and styles excluded
+TEXT_XPATH = etree.XPath(".//text()[not(ancestor::script) and not(ancestor::style)]")
+
+_PARSER = lxml.html.HTMLParser(encoding="utf-8")
+
+# Pages handed to a worker process at a time
+CHUNK_SIZE = 16
+
+
+# =============================
+# HELPERS
+# =============================
+
+def parse_html(html: str | bytes):
+    """
+    Parses a page into an lxml document.
+    """
+    if isinstance(html, str):
+        html = html.encode("utf-8")
+    return lxml.html.document_fromstring(html, parser=_PARSER)
+
+
+def _first(xpath: etree.XPath, doc):
+    found = xpath(doc)
+    return found[0] if found else None
+
+
+def _text(element) -> str | None:
+    """
+    Same result as BeautifulSoup get_text(strip=True).
+    """
+    if element is None:
+        return None
+    return "".join(part.strip() for part in TEXT_XPATH(element))
+
+
+# =============================
+# EXTRACTION
+# =============================
+
+def has_card_markup(doc) -> bool:
+    """
+    Checks that a page contains the organization card
+    (not a captcha or an empty client-side shell).
+    """
+    return _first(NAME_XPATH, doc) is not None and _first(ADDRESS_BLOCK_XPATH, doc) is not None
+
+
+def working_hours(doc) -> str | None:
+    """
+    Extracts and normalizes working hours from the page.
+    """
+    status = _text(_first(STATUS_XPATH, doc))
+
+    # Check for 24/7 operation
+    if status and "круглосуточ" in status.lower():
+        return "24/7"
+
+    entries = [content for content in HOURS_XPATH(doc) if content]
+    if not entries:
+        return None
+
+    return compact_hours(entries)
+
+
+def extract_row(doc, url: str, city: str, category: str, filter_address: bool) -> dict | None:
+    """
+    Extracts business data from a parsed organization page.
+    Returns None if the address is outside the city.
+    """
+    address_text = _text(_first(ADDRESS_XPATH, doc))
+
+    # Optional city-based filtering
+    if filter_address and address_text and not address_in_city(address_text, city):
+        print(f"⛔ Skipped (outside city): {address_text}")
+        return None
+
+    return {
+        "Category": category,
+        "City": city,
+        "Name": _text(_first(NAME_XPATH, doc)),
+        "Address": address_text,
+        "Phone": canonical_phone(_text(_first(PHONE_XPATH, doc))),
+        "Website": _text(_first(SITE_XPATH, doc)),
+        "Working Hours": working_hours(doc),
+        "URL": url
+    }
+
+
+def extract_card(html: str | bytes, url: str, city: str, category: str, filter_address: bool) -> dict | None:
+    """
+    Parses a page and extracts its row.
+    """
+    return extract_row(parse_html(html), url, city, category, filter_address)
+
+
+# =============================
+# BATCH EXTRACTION
+# =============================
+
+def map_pages(func: Callable, jobs: Iterable, workers: int | None = None) -> Iterator:
+    """
+    Runs func over page jobs in a process pool and yields
+    results in job order; workers=1 runs in this process.
+    Shared by extract_directory and reparse.reparse_archive.
+    """
+    if workers == 1:
+        yield from map(func, jobs)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(func, jobs, chunksize=CHUNK_SIZE)
+
+
+def _extract_file(args: Tuple[str, str, str, bool]) -> Tuple[str, dict | None]:
+    path, city, category, filter_address = args
+
+    doc = parse_html(Path(path).read_bytes())
+    if not has_card_markup(doc):
+        return path, None
+
+    url = _first(CANONICAL_XPATH, doc) or Path(path).as_uri()
+    return path, extract_row(doc, url, city, category, filter_address)
+
+
+def extract_directory(directory: Path | str, city: str, category: str, filter_address: bool = False,
+                      workers: int | None = None, pattern: str = "*.html") -> Iterator[Tuple[str, dict | None]]:
+    """
+    Extracts every saved page in a directory using a process
+    pool. Yields (path, row or None) in file name order;
+    pages without a card give None. The page URL is taken
+    from its canonical link.
+    """
+    paths = sorted(str(p) for p in Path(directory).glob(pattern))
+    jobs = [(path, city, category, filter_address) for path in paths]
+    return map_pages(_extract_file, jobs, workers)
+
+
+def main():
+    from crm_schema import SCRAPED_COLUMNS
+    from row_sinks import FORMATS, open_sink
+
+    parser = argparse.ArgumentParser(description="Extract organization rows from saved card pages")
+    parser.add_argument("directory", help="Directory with saved .html pages")
+    parser.add_argument("--city", default="")
+    parser.add_argument("--category", default="")
+    parser.add_argument("--filter-address", action="store_true",
+                        help="Skip addresses outside --city")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Extraction processes (default: CPU count)")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args()
+
+    skipped = 0
+    with open_sink(Path(args.output), args.format, SCRAPED_COLUMNS) as sink:
+        for path, row in extract_directory(args.directory, args.city, args.category,
+                                           args.filter_address, args.workers):
+            if row:
+                sink.write(row)
+            else:
+                skipped += 1
+
+    print(f"Saved {sink.count} records to {args.output} ({skipped} pages skipped)")
+
+
+if __name__ == "__main__":
+    main()
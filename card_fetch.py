@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+"""
+HTTP Card Fetcher
+
+Fetches organization pages with a pooled keep-alive HTTP
+client instead of a full browser. Cookies and user agent are
+copied from a WebDriver session, so requests look like the
+browser that collected the links.
+
+Used by yandex_maps_parsing as an alternative card-fetch backend;
+pages without the expected markup are re-opened in the browser.
+"""
+
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# =============================
+# CONFIGURATION
+# =============================
+
+# Concurrent HTTP requests per fetcher
+HTTP_CONCURRENCY = 4
+
+# Pages fetched ahead of the consumer, per concurrent request
+IN_FLIGHT_FACTOR = 2
+
+# Request timeout (seconds)
+HTTP_TIMEOUT = 15
+
+# Anti-blocking delay per request (base + random jitter)
+HTTP_DELAY = 0.3
+HTTP_JITTER = 0.4
+
+DEFAULT_HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "ru-RU,ru;q=0.9,en;q=0.8",
+}
+
+
+# =============================
+# FETCHER
+# =============================
+
+class HttpCardFetcher:
+    """
+    Keep-alive HTTP client for organization pages.
+
+    Usage:
+        fetcher = HttpCardFetcher(driver)
+        for url, html in fetcher.fetch_many(links):
+            ...
+    """
+
+    def __init__(self, driver=None, concurrency: int = HTTP_CONCURRENCY, timeout: float = HTTP_TIMEOUT):
+        self.concurrency = max(concurrency, 1)
+        self.timeout = timeout
+        self.fetched = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        if driver is not None:
+            self.sync_from_driver(driver)
+
+    def sync_from_driver(self, driver):
+        """
+        Copies user agent and cookies from the browser session.
+        """
+        try:
+            self.session.headers["User-Agent"] = driver.execute_script("return navigator.userAgent")
+        except Exception as e:
+            print(f"User agent copy error: {e}")
+
+        try:
+            for cookie in driver.get_cookies():
+                self.session.cookies.set(
+                    cookie["name"],
+                    cookie["value"],
+                    domain=cookie.get("domain"),
+                    path=cookie.get("path", "/"),
+                )
+        except Exception as e:
+            print(f"Cookie copy error: {e}")
+
+    def fetch(self, url: str) -> str | None:
+        """
+        Returns page HTML or None if the request failed.
+        """
+        time.sleep(HTTP_DELAY + random.uniform(0, HTTP_JITTER))
+
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"HTTP fetch error {url}: {e}")
+            response = None
+
+        with self._lock:
+            if response is not None and response.status_code == 200:
+                self.fetched += 1
+                # requests assumes latin-1 when no charset is sent
+                if "charset" not in response.headers.get("Content-Type", ""):
+                    response.encoding = "utf-8"
+                return response.text
+            self.failed += 1
+
+        if response is not None:
+            print(f"HTTP {response.status_code}: {url}")
+        return None
+
+    def fetch_many(self, urls: Iterable[str]) -> Iterator[Tuple[str, str | None]]:
+        """
+        Fetches pages with bounded concurrency and yields
+        (url, html or None) in input order. At most
+        IN_FLIGHT_FACTOR * concurrency pages are requested or
+        held ahead of the consumer, so fetched pages don't pile
+        up while it waits on slow browser fallbacks.
+        """
+        window = self.concurrency * IN_FLIGHT_FACTOR
+        in_flight = deque()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for url in urls:
+                in_flight.append((url, pool.submit(self.fetch, url)))
+                if len(in_flight) >= window:
+                    url, future = in_flight.popleft()
+                    yield url, future.result()
+
+            while in_flight:
+                url, future = in_flight.popleft()
+                yield url, future.result()
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,154 @@
+"""
+Company Dedup Index
+
+Local index of companies already in amoCRM, keyed by
+normalized URL (custom field 964013) and phone. Loaded once
+with bulk paged reads of the tagged companies and cached
+on disk with a TTL, so the importer can skip rows that
+were imported before without a lookup per row.
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Iterable, Tuple
+
+from amocrm.v2.filters import SingleFilter, SingleListFilter
+from amocrm.v2.interaction import GenericInteraction
+
+from normalize import normalize_phone, normalize_url
+
+
+# ======================
+# CONFIGURATION
+# ======================
+
+INDEX_PATH = Path(".cache") / "company_index.json"
+
+# Cached index is rebuilt from the API after this many seconds
+INDEX_TTL = 6 * 3600
+
+# Company custom field holding the map URL
+URL_FIELD_ID = 964013
+
+companies_api = GenericInteraction(path="companies")
+company_tags_api = GenericInteraction(path="companies/tags", field="tags")
+
+
+# ======================
+# NORMALIZATION
+# ======================
+
+def company_keys(data: dict) -> Tuple[str | None, str | None]:
+    """
+    Returns (normalized URL, normalized phone) from
+    raw company data or an add payload.
+    """
+    url = phone = None
+    for field in data.get("custom_fields_values") or []:
+        values = field.get("values") or []
+        if not values:
+            continue
+        if field.get("field_id") == URL_FIELD_ID:
+            url = normalize_url(values[0].get("value"))
+        elif field.get("field_code") == "PHONE":
+            phone = normalize_phone(values[0].get("value"))
+    return url, phone
+
+
+# ======================
+# INDEX
+# ======================
+
+class CompanyIndex:
+    """
+    Maps normalized URL / phone → company ID.
+    """
+
+    def __init__(self, by_url: dict = None, by_phone: dict = None, built_at: float = None):
+        self.by_url = by_url or {}
+        self.by_phone = by_phone or {}
+        self.built_at = built_at or time.time()
+
+    def __len__(self):
+        return len(set(self.by_url.values()) | set(self.by_phone.values()))
+
+    def match(self, url: str | None, phone: str | None) -> int | None:
+        """
+        Returns the ID of an existing company with the
+        same URL or, failing that, the same phone.
+        """
+        if url and url in self.by_url:
+            return self.by_url[url]
+        if phone and phone in self.by_phone:
+            return self.by_phone[phone]
+        return None
+
+    def add(self, company_id: int, url: str | None, phone: str | None):
+        if url:
+            self.by_url.setdefault(url, company_id)
+        if phone:
+            self.by_phone.setdefault(phone, company_id)
+
+    # ---------- building ----------
+
+    @classmethod
+    def from_companies(cls, companies: Iterable[dict]) -> "CompanyIndex":
+        index = cls()
+        for data in companies:
+            index.add(data["id"], *company_keys(data))
+        return index
+
+    @classmethod
+    def fetch(cls, tag_name: str) -> "CompanyIndex":
+        """
+        Pages through all companies with the tag (250 per request).
+        """
+        tag_id = None
+        for tag in company_tags_api.get_all(filters=(SingleFilter("name")(tag_name),)):
+            if tag["name"].lower() == tag_name.lower():
+                tag_id = tag["id"]
+                break
+
+        if tag_id is None:
+            return cls()
+
+        return cls.from_companies(
+            companies_api.get_all(filters=(SingleListFilter("tags")(tag_id),))
+        )
+
+    # ---------- disk cache ----------
+
+    @classmethod
+    def load(cls, tag_name: str, path: Path = INDEX_PATH, ttl: float = INDEX_TTL,
+             refresh: bool = False) -> "CompanyIndex":
+        """
+        Returns the cached index if it is younger than ttl,
+        otherwise rebuilds it from the API and caches it.
+        """
+        path = Path(path)
+
+        if not refresh and path.exists():
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+                if data.get("tag") == tag_name and time.time() - data["built_at"] < ttl:
+                    return cls(data["by_url"], data["by_phone"], data["built_at"])
+            except (ValueError, KeyError) as e:
+                print(f"Company index cache ignored: {e}")
+
+        index = cls.fetch(tag_name)
+        index.save(tag_name, path)
+        return index
+
+    def save(self, tag_name: str, path: Path = INDEX_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            json.dumps({
+                "tag": tag_name,
+                "built_at": self.built_at,
+                "by_url": self.by_url,
+                "by_phone": self.by_phone,
+            }, ensure_ascii=False),
+            encoding="utf-8",
+        )
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""
+Shared Column Schema
+
+Single description of the organization record passed from
+the scraper to the CRM importer. The scraper writes the
+"scraped" headers, the importer reads the "imported" ones;
+files with either set of headers can be imported.
+"""
+
+from typing import NamedTuple
+
+import pandas as pd
+
+
+class Column(NamedTuple):
+    key: str              # canonical field name
+    scraped: str | None   # header written by yandex_maps_parsing
+    imported: str | None  # header read by excel_import
+
+
+COLUMNS = (
+    Column("category", "Category", None),
+    Column("city", "City", "Город"),
+    Column("name", "Name", "Название"),
+    Column("address", "Address", "Адрес"),
+    Column("phone", "Phone", "Телефон"),
+    Column("website", "Website", "Сайт"),
+    Column("working_hours", "Working Hours", "Часы работы"),
+    Column("url", "URL", "URL"),
+    Column("district", None, "Район"),
+)
+
+# Output columns of the scraper, in file order
+SCRAPED_COLUMNS = [c.scraped for c in COLUMNS if c.scraped]
+
+# Canonical key → importer header
+IMPORTED = {c.key: c.imported for c in COLUMNS if c.imported}
+
+# Scraper header → importer header
+SCRAPED_TO_IMPORTED = {c.scraped: c.imported for c in COLUMNS if c.scraped and c.imported}
+
+
+def to_import_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Renames scraper headers to importer headers.
+    Frames that already use importer headers are unchanged.
+    """
+    return df.rename(columns=SCRAPED_TO_IMPORTED)
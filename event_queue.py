@@ -0,0 +1,167 @@
+"""
+Durable Company Event Queue
+
+SQLite-backed queue used by funnel_service. Webhook events are
+committed before amoCRM gets its response, so nothing is lost
+if the service stops.
+
+Events are coalesced per company: one row per company ID, and
+every new event bumps its version and pushes its due time by
+the coalescing delay. A company updated ten times in a burst
+is processed once, after the burst.
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Tuple
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    company_id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    events INTEGER NOT NULL DEFAULT 1,
+    version INTEGER NOT NULL DEFAULT 1,
+    due_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS events_due ON events (claimed, due_at);
+"""
+
+
+class EventQueue:
+    """
+    Thread-safe coalescing queue of company IDs.
+
+    claim() hands out a due company with its version;
+    done() removes it unless a newer event arrived meanwhile,
+    fail() schedules a retry with exponential backoff.
+    """
+
+    def __init__(self, path: Path | str, delay: float = 2, max_attempts: int = 5, retry_delay: float = 30):
+        self.path = Path(path)
+        self.delay = delay
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        # Claims of a previous process are void
+        self._conn.execute("UPDATE events SET claimed = 0")
+        self._conn.commit()
+
+    # ---------- producers ----------
+
+    def put(self, company_id: int, kind: str):
+        """
+        Records an event; repeat events for a queued
+        company are merged into its row.
+        """
+        self.put_many([(company_id, kind)])
+
+    def put_many(self, events: Iterable[Tuple[int, str]]):
+        """
+        Records (company_id, kind) events from one webhook
+        in a single transaction.
+        """
+        due_at = time.time() + self.delay
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO events (company_id, kind, due_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (company_id) DO UPDATE SET "
+                "kind = excluded.kind, events = events + 1, version = version + 1, "
+                "due_at = excluded.due_at, attempts = 0, error = NULL",
+                [(company_id, kind, due_at) for company_id, kind in events],
+            )
+            self._conn.commit()
+            self._ready.notify_all()
+
+    def discard(self, company_id: int):
+        """
+        Drops a queued company (e.g. it was deleted).
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM events WHERE company_id = ? AND claimed = 0", (company_id,))
+            self._conn.commit()
+
+    # ---------- consumers ----------
+
+    def claim(self, timeout: float = 1) -> Tuple[int, int, int] | None:
+        """
+        Waits up to timeout for a due company.
+        Returns (company_id, version, events) or None.
+        """
+        deadline = time.monotonic() + timeout
+
+        with self._lock:
+            while True:
+                now = time.time()
+                row = self._conn.execute(
+                    "SELECT company_id, version, events FROM events "
+                    "WHERE claimed = 0 AND attempts < ? AND due_at <= ? ORDER BY due_at LIMIT 1",
+                    (self.max_attempts, now),
+                ).fetchone()
+
+                if row:
+                    self._conn.execute("UPDATE events SET claimed = 1 WHERE company_id = ?", (row[0],))
+                    self._conn.commit()
+                    return row
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+
+                # Sleep until the next row is due, a put() or the deadline
+                next_due = self._conn.execute(
+                    "SELECT MIN(due_at) FROM events WHERE claimed = 0 AND attempts < ?",
+                    (self.max_attempts,),
+                ).fetchone()[0]
+                wait = remaining if next_due is None else min(remaining, max(next_due - now, 0.01))
+                self._ready.wait(wait)
+
+    def done(self, company_id: int, version: int):
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM events WHERE company_id = ? AND version = ?", (company_id, version)
+            )
+            if cursor.rowcount == 0:
+                # A newer event arrived while processing: run it again
+                self._conn.execute("UPDATE events SET claimed = 0 WHERE company_id = ?", (company_id,))
+                self._ready.notify()
+            self._conn.commit()
+
+    def fail(self, company_id: int, version: int, error: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE events SET claimed = 0, "
+                "attempts = CASE WHEN version = ? THEN attempts + 1 ELSE attempts END, "
+                "due_at = CASE WHEN version = ? THEN ? + ? * (1 << attempts) ELSE due_at END, "
+                "error = ? WHERE company_id = ?",
+                (version, version, time.time(), self.retry_delay, error, company_id),
+            )
+            self._conn.commit()
+
+    # ---------- stats ----------
+
+    def counts(self) -> Tuple[int, int]:
+        """
+        Returns (queued, failed) — failed rows ran out of
+        attempts and wait for a new event or manual cleanup.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COALESCE(SUM(attempts < ?), 0), COALESCE(SUM(attempts >= ?), 0) FROM events",
+                (self.max_attempts, self.max_attempts),
+            ).fetchone()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -3,38 +3,43 @@ Excel → amoCRM Company Import Script
 
 This script imports companies from an Excel file into amoCRM.
 It maps Excel columns to amoCRM custom fields and automatically
-adds a tag to each created company.
+adds a tag to each created company. The file is streamed in
+chunks (xlsx in read-only mode; CSV, Parquet and JSONL are also
+accepted) and companies are sent in bulk requests of up to
+BATCH_SIZE entities.
 
 IMPORTANT:
 Credentials must be stored in environment variables.
 Do NOT hardcode secrets in this file.
 """
 
-import os
+from itertools import chain, islice
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple
+
 import pandas as pd
-from amocrm.v2 import Company as BaseCompany, Contact, tokens, custom_field
+from amocrm.v2 import Company as BaseCompany, Contact, custom_field
+from amocrm.v2.interaction import GenericInteraction
+
+from amo_executor import WORKERS, RequestExecutor, configure
+from company_index import CompanyIndex, company_keys
+from crm_schema import IMPORTED, to_import_columns
+from normalize import normalize_frame
 
 
 # ======================================================
 # TOKEN CONFIGURATION (SECURE)
 # ======================================================
-# The following environment variables must be set:
+# Tokens are configured on first use (amo_auth, via
+# amo_executor.configure). The following environment
+# variables must be set:
 # AMO_CLIENT_ID
 # AMO_CLIENT_SECRET
 # AMO_SUBDOMAIN
 # AMO_REDIRECT_URL
-# AMO_AUTH_CODE (used only once to initialize OAuth)
-
-tokens.default_token_manager(
-    client_id=os.getenv("AMO_CLIENT_ID"),
-    client_secret=os.getenv("AMO_CLIENT_SECRET"),
-    subdomain=os.getenv("AMO_SUBDOMAIN"),
-    redirect_url=os.getenv("AMO_REDIRECT_URL"),
-    storage=tokens.FileTokensStorage()
-)
 
 # Run this ONCE manually to initialize OAuth:
-# tokens.default_token_manager.init(code=os.getenv("AMO_AUTH_CODE"))
+# python amo_auth.py --code <AMO_AUTH_CODE>
 
 
 # ======================================================
@@ -64,83 +69,499 @@ class ContactWithPhone(Contact):
     pass
 
 
+# ======================================================
+# Streaming Input
+# ======================================================
+
+# Rows read, mapped and uploaded together
+CHUNK_SIZE = 1000
+
+INPUT_FORMATS = (".xlsx", ".xlsm", ".csv", ".parquet", ".jsonl")
+
+
+def count_rows(file_path: str) -> int | None:
+    """
+    Returns the number of data rows when the format
+    stores it cheaply, otherwise None.
+    """
+    suffix = Path(file_path).suffix.lower()
+
+    if suffix in (".xlsx", ".xlsm"):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            rows = workbook.active.max_row
+            return rows - 1 if rows else None
+        finally:
+            workbook.close()
+
+    if suffix == ".parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(file_path).metadata.num_rows
+
+    return None
+
+
+def _read_xlsx_chunks(file_path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(c) if c is not None else "" for c in header]
+
+        start = 0
+        while chunk := list(islice(rows, chunk_size)):
+            yield pd.DataFrame(chunk, columns=columns, index=range(start, start + len(chunk)))
+            start += len(chunk)
+    finally:
+        workbook.close()
+
+
+def _read_parquet_chunks(file_path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    import pyarrow.parquet as pq
+
+    start = 0
+    for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_size):
+        df = batch.to_pandas()
+        df.index = range(start, start + len(df))
+        start += len(df)
+        yield df
+
+
+def read_chunks(file_path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Reads an input file in fixed-size DataFrame chunks.
+    Peak memory depends on the chunk size, not the file size.
+    The index continues across chunks (row number - 1).
+    Scraper output headers are renamed to import headers,
+    so yandex_maps_parsing results import as-is. Phones,
+    websites and hours are normalized per chunk (normalize.py).
+    """
+    suffix = Path(file_path).suffix.lower()
+
+    if suffix in (".xlsx", ".xlsm"):
+        chunks = _read_xlsx_chunks(file_path, chunk_size)
+    elif suffix == ".csv":
+        chunks = pd.read_csv(file_path, chunksize=chunk_size, dtype=str)
+    elif suffix == ".parquet":
+        chunks = _read_parquet_chunks(file_path, chunk_size)
+    elif suffix == ".jsonl":
+        chunks = pd.read_json(file_path, lines=True, chunksize=chunk_size, dtype=False)
+    else:
+        raise ValueError(f"Unsupported input format: {suffix} (expected {', '.join(INPUT_FORMATS)})")
+
+    for chunk in chunks:
+        chunk.columns = chunk.columns.str.strip()
+        yield normalize_frame(to_import_columns(chunk))
+
+
+# ======================================================
+# Row Mapping
+# ======================================================
+
+# Tag added to every imported company for source tracking
+COMPANY_TAG = "yandex_car_washing"
+
+# Maximum number of companies amoCRM accepts in one add request
+BATCH_SIZE = 250
+
+# Rows matching a company already in CRM (by URL or phone):
+# False = skip them, True = send them as batched updates
+UPDATE_EXISTING = False
+
+# Input column → Company custom field
+COLUMN_FIELDS = {
+    IMPORTED['url']: Company.url,
+    IMPORTED['website']: Company.site,
+    IMPORTED['working_hours']: Company.work_hours,
+    IMPORTED['city']: Company.city,
+    IMPORTED['district']: Company.district,
+    IMPORTED['name']: Company.company_name,
+    IMPORTED['phone']: Company.phone,
+}
+
+companies_api = GenericInteraction(path="companies")
+
+
+def _text_column(df: pd.DataFrame, column: str) -> list:
+    """
+    Returns the column as str values (None for empty cells).
+    """
+    if column not in df.columns:
+        return [None] * len(df)
+    values = df[column]
+    return values.astype(str).astype(object).where(values.notna(), None).tolist()
+
+
+def _field_payload(field, value: str) -> dict:
+    payload = {k: v for k, v in field._create_raw_field().items() if v is not None}
+    payload["values"] = field.on_set_instance([], value)
+    return payload
+
+
+def build_company_payloads(df: pd.DataFrame) -> List[Tuple[int, dict]]:
+    """
+    Maps a chunk of input rows to company add payloads.
+    Columns are converted once per chunk, not per cell.
+
+    Returns:
+        List of (row index, payload)
+    """
+    addresses = _text_column(df, IMPORTED['address'])
+    columns = {column: _text_column(df, column) for column in COLUMN_FIELDS}
+
+    payloads = []
+    for i, index in enumerate(df.index):
+        custom_fields = [
+            _field_payload(field, columns[column][i])
+            for column, field in COLUMN_FIELDS.items()
+            if columns[column][i] is not None
+        ]
+
+        payload = {
+            # Use address as company name if available
+            "name": addresses[i] if addresses[i] is not None else 'No address provided',
+            # Add tag for tracking source
+            "_embedded": {"tags": [{"name": COMPANY_TAG}]},
+        }
+        if custom_fields:
+            payload["custom_fields_values"] = custom_fields
+
+        payloads.append((index, payload))
+
+    return payloads
+
+
+# ======================================================
+# Bulk Creation
+# ======================================================
+
+def _validation_errors(response) -> dict:
+    """
+    Maps request_id → error text from a 400 response body.
+    """
+    errors = {}
+    for item in (response or {}).get("validation-errors", []):
+        details = "; ".join(
+            f"{err.get('path')}: {err.get('detail')}" for err in item.get("errors", [])
+        )
+        errors[str(item.get("request_id"))] = details or "Validation error"
+    return errors
+
+
+def create_companies_batch(batch: List[Tuple[int, dict]]) -> List[Tuple[int, int | None, str | None]]:
+    """
+    Creates a chunk of companies with a single bulk POST.
+
+    Every payload carries its row index as request_id, so the
+    IDs in the response are mapped back to rows. amoCRM rejects the
+    whole request if any entity is invalid: rows named in the
+    validation errors are reported and the rest are re-sent.
+
+    Returns:
+        List of (row index, company ID or None, error or None)
+    """
+    pending = {str(index): payload for index, payload in batch}
+    results = {}
+
+    while pending:
+        payload = [
+            {**company, "request_id": request_id}
+            for request_id, company in pending.items()
+        ]
+
+        try:
+            response, status = companies_api.request("post", companies_api.path, data=payload)
+        except Exception as e:
+            for request_id in pending:
+                results[request_id] = (None, str(e))
+            break
+
+        if status == 400:
+            errors = _validation_errors(response)
+            rejected = [request_id for request_id in pending if request_id in errors]
+
+            # The response doesn't name the rejected rows, so fail the whole chunk
+            if not rejected:
+                for request_id in pending:
+                    results[request_id] = (None, f"Validation error: {response}")
+                break
+
+            for request_id in rejected:
+                results[request_id] = (None, errors[request_id])
+                del pending[request_id]
+            continue
+
+        for item in response["_embedded"]["companies"]:
+            request_id = str(item.get("request_id"))
+            if request_id in pending:
+                results[request_id] = (item["id"], None)
+
+        for request_id in pending:
+            results.setdefault(request_id, (None, "Missing in API response"))
+        break
+
+    return [(index, *results[str(index)]) for index, _ in batch]
+
+
+def update_companies_batch(batch: List[Tuple[int, dict]]) -> List[Tuple[int, int | None, str | None]]:
+    """
+    Updates a chunk of existing companies with a single
+    bulk PATCH. Payloads must carry the company "id".
+
+    Returns:
+        List of (row index, company ID or None, error or None)
+    """
+    payload = []
+    for _, company in batch:
+        # Tags sent on update replace the existing ones
+        payload.append({k: v for k, v in company.items() if k != "_embedded"})
+
+    try:
+        response, status = companies_api.request("patch", companies_api.path, data=payload)
+        if status == 400:
+            raise ValueError(_validation_errors(response) or response)
+    except Exception as e:
+        return [(index, None, str(e)) for index, _ in batch]
+
+    return [(index, company["id"], None) for index, company in batch]
+
+
+def send_companies_batch(batch: List[Tuple[int, dict]]) -> List[Tuple[int, int | None, str | None]]:
+    """
+    Creates new companies or updates existing ones
+    (payloads with an "id"); a batch holds only one kind.
+    """
+    if batch and "id" in batch[0][1]:
+        return update_companies_batch(batch)
+    return create_companies_batch(batch)
+
+
 # ======================================================
 # Excel Import Logic
 # ======================================================
 
-def import_companies_from_excel(file_path: str):
+def import_companies_from_excel(file_path: str, batch_size: int = BATCH_SIZE, workers: int = WORKERS,
+                                chunk_size: int = CHUNK_SIZE, update_existing: bool = UPDATE_EXISTING,
+                                refresh_index: bool = False):
     """
     Imports companies from an Excel file into amoCRM.
+    CSV, Parquet and JSONL files with the same columns
+    are accepted too. The file is streamed in chunks.
 
     Args:
-        file_path (str): Path to the Excel file
+        file_path (str): Path to the input file
+        batch_size (int): Companies sent per bulk request (1 = one request per row)
+        workers (int): Number of bulk requests sent concurrently
+        chunk_size (int): Rows read and mapped at a time
+        update_existing (bool): Update matched companies instead of skipping them
+        refresh_index (bool): Rebuild the cached company index from the API
     """
 
-    # Load Excel file
+    # The first chunk is read before touching the CRM, so a missing
+    # file or an unsupported format fails here, not after auth
     try:
-        df = pd.read_excel(file_path)
+        total = count_rows(file_path)
+        chunks = read_chunks(file_path, chunk_size)
+        first = next(chunks, None)
     except Exception as e:
-        print(f"Error reading Excel file: {e}")
+        print(f"Error reading input file: {e}")
         return
 
-    df.columns = df.columns.str.strip()
-    print(f"Found {len(df)} records for import\n")
-
-    success_count = 0
-    error_count = 0
-
-    for index, row in df.iterrows():
-        try:
-            company = Company()
-
-            # ===============================
-            # Mapping Excel columns → CRM
-            # ===============================
+    if first is None or first.empty:
+        print(f"No records found in {file_path}")
+        return
+    chunks = chain([first], chunks)
 
-            # Use address as company name if available
-            if pd.notna(row.get('Адрес')):
-                company.name = str(row['Адрес'])
-            else:
-                company.name = 'No address provided'
+    if total is not None:
+        print(f"Found {total} records for import\n")
+    else:
+        print(f"Streaming records from {file_path}\n")
 
-            if pd.notna(row.get('URL')):
-                company.url = str(row['URL'])
+    upload_companies(chunks, total, batch_size, workers, update_existing, refresh_index)
 
-            if pd.notna(row.get('Адрес')):
-                company.address = str(row['Адрес'])
 
-            if pd.notna(row.get('Сайт')):
-                company.site = str(row['Сайт'])
+# Marks the end of an input chunk in the row stream
+_CHUNK_END = None
 
-            if pd.notna(row.get('Часы работы')):
-                company.work_hours = str(row['Часы работы'])
 
-            if pd.notna(row.get('Город')):
-                company.city = str(row['Город'])
+def upload_companies(chunks: Iterable[pd.DataFrame], total: int | None = None, batch_size: int = BATCH_SIZE,
+                     workers: int = WORKERS, update_existing: bool = UPDATE_EXISTING,
+                     refresh_index: bool = False):
+    """
+    Uploads DataFrame chunks with import columns to amoCRM.
+    Chunk indexes must be unique; they are reported as row numbers.
+    Each chunk is flushed to the API before the next one is awaited.
+
+    Rows whose URL or phone already belongs to a tagged
+    company are skipped, or updated in bulk with
+    update_existing. Rows repeating an earlier row of the
+    input wait for that row's create: they are dropped if
+    it succeeds and retried if it fails.
+    """
 
-            if pd.notna(row.get('Район')):
-                company.district = str(row['Район'])
+    configure(workers=workers)
 
-            if pd.notna(row.get('Название')):
-                company.company_name = str(row['Название'])
+    index = CompanyIndex.load(COMPANY_TAG, refresh=refresh_index)
+    print(f"Companies already in CRM: {len(index)}\n")
 
-            if pd.notna(row.get('Телефон')):
-                company.phone = str(row['Телефон'])
+    success_count = 0
+    updated_count = 0
+    skipped_count = 0
+    repeated_count = 0
+    error_count = 0
+    processed = 0
+    names = {}
+    keys = {}
 
-            # Add tag for tracking source
-            company.tags.append("yandex_car_washing")
+    # Rows queued for creation, by URL / phone → row index
+    owner_by_url, owner_by_phone = {}, {}
+    # Row index → later rows with the same keys, waiting for its create
+    held = {}
+    # Companies created / queued for update in this run
+    created_ids, queued_ids = set(), set()
 
-            # Save to amoCRM
-            company.save()
+    def position(index):
+        return f"{index + 1}/{total if total is not None else '?'}"
 
-            success_count += 1
-            print(f"✓ [{index + 1}/{len(df)}] Company created (ID: {company.id})")
+    def input_rows():
+        nonlocal error_count, processed
 
+        try:
+            for chunk in chunks:
+                processed += len(chunk)
+                yield from build_company_payloads(chunk)
+                # Don't hold rows back while the next chunk is awaited
+                yield _CHUNK_END
         except Exception as e:
             error_count += 1
-            company_name = row.get('Адрес', 'Unknown')
-            print(f"✗ [{index + 1}/{len(df)}] Error creating company '{company_name}': {str(e)}")
-            continue
+            print(f"Error reading input: {e}")
+
+    def classify(row_index, payload):
+        """
+        Returns (queue, row) to send the row, or None.
+        """
+        nonlocal skipped_count, repeated_count
+
+        url, phone = company_keys(payload)
+        company_id = index.match(url, phone)
+
+        if company_id in created_ids:
+            repeated_count += 1
+            return None
+
+        if company_id is None:
+            owner = owner_by_url.get(url) if url else None
+            if owner is None and phone:
+                owner = owner_by_phone.get(phone)
+            if owner is not None:
+                held.setdefault(owner, []).append((row_index, payload))
+                return None
+
+            if url:
+                owner_by_url[url] = row_index
+            if phone:
+                owner_by_phone[phone] = row_index
+            keys[row_index] = (url, phone)
+            names[row_index] = payload["name"]
+            return "new", (row_index, payload)
+
+        if not update_existing:
+            skipped_count += 1
+            return None
+
+        if company_id in queued_ids:
+            repeated_count += 1
+            return None
+
+        queued_ids.add(company_id)
+        names[row_index] = payload["name"]
+        return "existing", (row_index, {**payload, "id": company_id})
+
+    def release(row_index, created: bool) -> list:
+        """
+        Frees a finished row's keys. Returns rows held
+        behind it that need another attempt.
+        """
+        nonlocal repeated_count
+
+        url, phone = keys.pop(row_index)
+        if url and owner_by_url.get(url) == row_index:
+            del owner_by_url[url]
+        if phone and owner_by_phone.get(phone) == row_index:
+            del owner_by_phone[phone]
+
+        waiting = held.pop(row_index, [])
+        if created:
+            repeated_count += len(waiting)
+            return []
+        return waiting
+
+    def batches(rows):
+        size = max(batch_size, 1)
+        pending = {"new": [], "existing": []}
+
+        for row in rows:
+            if row is _CHUNK_END:
+                for queue in pending.values():
+                    if queue:
+                        yield queue[:]
+                        queue.clear()
+                continue
+
+            classified = classify(*row)
+            if classified is None:
+                continue
+
+            queue = pending[classified[0]]
+            queue.append(classified[1])
+            if len(queue) >= size:
+                yield queue[:]
+                queue.clear()
+
+        for queue in pending.values():
+            if queue:
+                yield queue
+
+    rows = input_rows()
+
+    with RequestExecutor(workers) as executor:
+        while rows:
+            retry = []
+
+            for batch, results, batch_error in executor.map(send_companies_batch, batches(rows)):
+                if batch_error is not None:
+                    results = [(row_index, None, batch_error) for row_index, _ in batch]
+
+                is_update = "id" in batch[0][1]
+
+                for row_index, company_id, error in results:
+                    name = names.pop(row_index, 'Unknown')
+                    if error is None and is_update:
+                        updated_count += 1
+                        print(f"↻ [{position(row_index)}] Company updated (ID: {company_id})")
+                    elif error is None:
+                        success_count += 1
+                        created_ids.add(company_id)
+                        index.add(company_id, *keys[row_index])
+                        release(row_index, created=True)
+                        print(f"✓ [{position(row_index)}] Company created (ID: {company_id})")
+                    else:
+                        error_count += 1
+                        if not is_update:
+                            retry.extend(release(row_index, created=False))
+                        action = "updating" if is_update else "creating"
+                        print(f"✗ [{position(row_index)}] Error {action} company '{name}': {error}")
+
+            # Repeats of rows that failed get their own attempt
+            rows = sorted(retry, key=lambda row: row[0])
+
+    index.save(COMPANY_TAG)
 
     # ===============================
     # Summary
@@ -148,8 +569,11 @@ def import_companies_from_excel(file_path: str):
     print("\n" + "=" * 60)
     print("Import completed!")
     print(f"Successfully created: {success_count}")
+    print(f"Updated existing: {updated_count}")
+    print(f"Skipped (already in CRM): {skipped_count}")
+    print(f"Skipped (repeated in file): {repeated_count}")
     print(f"Errors: {error_count}")
-    print(f"Total processed: {len(df)}")
+    print(f"Total processed: {processed}")
     print("=" * 60)
 
 
@@ -0,0 +1,61 @@
+"""
+Compiled Custom-Field Mapping
+
+Copies company custom field values onto contact / lead
+payloads. The mapping is compiled once; every entity then
+costs a single pass over its custom_fields_values, and the
+result is plain dicts ready to be sent to the API.
+"""
+
+from typing import Dict, List
+
+
+class FieldMapper:
+    """
+    Maps source field ID → target field ID.
+
+    Usage:
+        mapper = FieldMapper({964013: 964089})
+        payload = mapper.build(company._data)
+    """
+
+    def __init__(self, mapping: Dict[int, int]):
+        self._targets = dict(mapping)
+        # Output keeps the mapping order
+        self._pairs = tuple(mapping.items())
+
+    def index(self, data: dict) -> Dict[int, object]:
+        """
+        Returns source field ID → first value for the
+        mapped fields, in one pass over the entity data.
+        """
+        targets = self._targets
+        wanted = len(targets)
+        found = {}
+
+        for field in data.get("custom_fields_values") or ():
+            field_id = field.get("field_id")
+            if field_id in targets and field_id not in found:
+                values = field.get("values")
+                if values:
+                    found[field_id] = values[0].get("value")
+                    # Stop once every mapped field is found
+                    if len(found) == wanted:
+                        break
+
+        return found
+
+    def build(self, data: dict) -> List[dict]:
+        """
+        Builds custom_fields_values for the target entity.
+        Empty values are left out.
+        """
+        found = self.index(data)
+        if not found:
+            return []
+
+        return [
+            {"field_id": target_id, "values": [{"value": value}]}
+            for field_id, target_id in self._pairs
+            if (value := found.get(field_id))
+        ]
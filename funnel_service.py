@@ -0,0 +1,327 @@
+"""
+amoCRM Funnel Webhook Service
+
+Long-running version of lead_creation_funnel_attribution.
+amoCRM posts company webhooks here; every tagged company that
+is added or updated (tag changes arrive as updates) gets a
+contact and an open lead in the target stage within seconds.
+
+Main features:
+- Webhook endpoint for companies add / update / restore / delete
+- Durable SQLite event queue (event_queue)
+- Coalescing of repeat events for the same company
+- Worker pool running the funnel logic through the
+  shared rate-limited session
+- Retries with backoff for failed companies
+
+For local testing set AMO_BASE_URL to a stub amoCRM server
+and post synthetic form-encoded webhooks to /webhook;
+benchmarks/run_funnel_service.py does this against fake_amo.
+"""
+
+import os
+import re
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Tuple
+from urllib.parse import parse_qs, parse_qsl, urlsplit
+
+from amocrm.v2 import Company
+
+from amo_executor import WORKERS, configure
+from event_queue import EventQueue
+from lead_creation_funnel_attribution import (
+    DRY_RUN, TAG_NAME, build_open_lead_index, company_has_exact_tag,
+    contact_links, entity_cache, process_company, stage_moves,
+)
+
+
+# ======================
+# CONFIGURATION
+# ======================
+
+HOST = os.getenv("FUNNEL_HOST", "0.0.0.0")
+PORT = int(os.getenv("FUNNEL_PORT", 8080))
+
+# Shared secret expected as ?token=... in the webhook URL (optional)
+WEBHOOK_TOKEN = os.getenv("FUNNEL_WEBHOOK_TOKEN")
+
+QUEUE_PATH = Path(".cache") / "funnel_events.sqlite3"
+
+# Seconds to wait after a company's last event before processing it
+COALESCE_DELAY = 2
+
+# Attempts per company before it is parked as failed
+MAX_ATTEMPTS = 5
+
+# First retry delay in seconds, doubled on every attempt
+RETRY_DELAY = 30
+
+# Largest webhook body accepted
+MAX_BODY = 1024 * 1024
+
+
+# ======================
+# WEBHOOK PARSING
+# ======================
+
+_COMPANY_KEY_RE = re.compile(r"^companies\[(\w+)\]\[(\d+)\]\[(\w+)\](?:\[\d+\]\[(\w+)\])?$")
+
+
+def parse_company_events(body: str) -> List[Tuple[str, int]]:
+    """
+    Extracts (action, company ID) pairs from a form-encoded
+    amoCRM webhook, e.g. companies[update][0][id]=123.
+    Raises ValueError on a malformed company ID.
+
+    Companies whose payload lists tags without TAG_NAME are
+    left out; payloads without tags are kept and checked by
+    the worker.
+    """
+    entries = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        match = _COMPANY_KEY_RE.match(key)
+        if not match:
+            continue
+
+        action, position, field, subfield = match.groups()
+        entry = entries.setdefault((action, position), {"id": None, "tags": None})
+
+        if field == "id" and subfield is None:
+            try:
+                entry["id"] = int(value)
+            except ValueError:
+                raise ValueError(f"invalid company id {value!r} in {key}") from None
+        elif field == "tags" and subfield == "name":
+            entry["tags"] = (entry["tags"] or []) + [value.lower()]
+
+    events = []
+    for (action, _), entry in entries.items():
+        if entry["id"] is None:
+            continue
+        if action != "delete" and entry["tags"] is not None and TAG_NAME.lower() not in entry["tags"]:
+            continue
+        events.append((action, entry["id"]))
+
+    return events
+
+
+# ======================
+# WORKERS
+# ======================
+
+def handle_company(company_id: int) -> str:
+    """
+    Runs the funnel for one company with fresh data.
+    Returns the process_company outcome or "ignored".
+    """
+    entity_cache.invalidate(Company, company_id)
+    company = entity_cache.get(Company, company_id)
+
+    if not company_has_exact_tag(company, TAG_NAME):
+        return "ignored"
+
+    open_leads = build_open_lead_index([company])
+    return process_company(company, open_leads)
+
+
+def flush_batches():
+    """
+    Sends queued contact links and stage moves.
+    """
+    if not DRY_RUN:
+        contact_links.flush()
+        stage_moves.flush()
+
+
+def funnel_worker(events: EventQueue, stop: threading.Event):
+    """
+    Processes due companies until stopped. The company's own
+    contact links and stage moves must be sent before its
+    event is marked done, so a repeat event sees the linked
+    contact; if they failed, the event is retried.
+    """
+    while not stop.is_set():
+        claimed = events.claim(timeout=1)
+
+        if claimed is None:
+            flush_batches()
+            continue
+
+        company_id, version, merged = claimed
+        try:
+            with contact_links.track() as links, stage_moves.track() as moves:
+                outcome = handle_company(company_id)
+            flush_batches()
+
+            # Waits for batches another worker is still sending
+            for future in links + moves:
+                future.result()
+        except Exception as e:
+            print(f"✗ Company {company_id}: {e}")
+            events.fail(company_id, version, str(e))
+            continue
+
+        events.done(company_id, version)
+        print(f"✓ Company {company_id}: {outcome} ({merged} event(s))")
+
+
+# ======================
+# HTTP ENDPOINT
+# ======================
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """
+    POST /webhook[?token=...] with a form-encoded amoCRM
+    webhook; GET /health reports the queue size.
+    """
+
+    events: EventQueue = None
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+
+        if url.path != "/webhook":
+            self._reply(404, "not found")
+            return
+
+        if WEBHOOK_TOKEN and parse_qs(url.query).get("token", [None])[0] != WEBHOOK_TOKEN:
+            self._reply(403, "forbidden")
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self._reply(400, "bad content length")
+            return
+
+        if length > MAX_BODY:
+            self._reply(413, "too large")
+            return
+
+        body = self.rfile.read(length).decode("utf-8", errors="replace")
+
+        try:
+            events = parse_company_events(body)
+        except ValueError as e:
+            self._reply(400, f"bad payload: {e}")
+            return
+
+        for action, company_id in events:
+            if action == "delete":
+                self.events.discard(company_id)
+
+        updates = [(company_id, action) for action, company_id in events if action != "delete"]
+        if updates:
+            self.events.put_many(updates)
+
+        # amoCRM only needs a fast 2xx; events are already on disk
+        self._reply(200, "ok")
+
+    def do_GET(self):
+        if urlsplit(self.path).path != "/health":
+            self._reply(404, "not found")
+            return
+
+        queued, failed = self.events.counts()
+        self._reply(200, f"queued={queued} failed={failed}")
+
+    def _reply(self, status: int, text: str):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FunnelService:
+    """
+    Webhook server plus worker pool.
+
+    Usage:
+        service = FunnelService(port=8080)
+        service.start()
+        ...
+        service.stop()
+    """
+
+    def __init__(self, host: str = HOST, port: int = PORT, workers: int = WORKERS,
+                 queue_path: Path | str = QUEUE_PATH):
+        self.workers = max(workers, 1)
+        self.events = EventQueue(queue_path, delay=COALESCE_DELAY,
+                                 max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_DELAY)
+
+        handler = type("Handler", (WebhookHandler,), {"events": self.events})
+        self.server = ThreadingHTTPServer((host, port), handler)
+
+        self._stop = threading.Event()
+        self._threads = []
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/webhook"
+
+    def start(self):
+        configure(workers=self.workers)
+
+        self._threads = [
+            threading.Thread(target=funnel_worker, args=(self.events, self._stop),
+                             name=f"funnel-{i + 1}", daemon=True)
+            for i in range(self.workers)
+        ]
+        self._threads.append(
+            threading.Thread(target=self.server.serve_forever, name="webhooks", daemon=True)
+        )
+
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Stops accepting webhooks, lets workers finish their
+        current company and flushes pending batches.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+        flush_batches()
+        self.events.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="amoCRM funnel webhook service")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Companies processed concurrently")
+    parser.add_argument("--queue", default=str(QUEUE_PATH),
+                        help="Event queue database")
+    args = parser.parse_args()
+
+    service = FunnelService(args.host, args.port, args.workers, args.queue)
+    service.start()
+
+    print(f"Funnel service on {service.url}")
+    print(f"Mode: {'DRY RUN' if DRY_RUN else 'LIVE'}")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print("\nStopping...")
+    finally:
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Funnel Sync State
+
+Local state of the incremental funnel sync
+(lead_creation_funnel_attribution --incremental):
+
+- high-water mark: companies and leads updated before it
+  were already handled
+- synced companies: company ID → (contact ID, lead ID) of the
+  contact and in-stage open lead set up for it
+- pending companies: failed ones, retried by ID on the next run
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Set
+
+
+STATE_PATH = Path(".cache") / "funnel_state.json"
+
+
+class SyncState:
+    """
+    Thread-safe sync state persisted as a JSON file.
+    """
+
+    def __init__(self, path: Path = STATE_PATH):
+        self.path = Path(path)
+        self.high_water: int | None = None
+        self.companies: Dict[int, List[int]] = {}
+        self.pending: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.companies)
+
+    # ---------- companies ----------
+
+    def is_synced(self, company_id: int, contact_ids: List[int], lead_ids: List[int]) -> bool:
+        """
+        True if the company was synced and its recorded
+        contact and lead are still linked to it.
+        """
+        with self._lock:
+            entry = self.companies.get(company_id)
+        return entry is not None and entry[0] in contact_ids and entry[1] in lead_ids
+
+    def mark(self, company_id: int, contact_id: int, lead_id: int):
+        with self._lock:
+            self.companies[company_id] = [contact_id, lead_id]
+            self.pending.discard(company_id)
+
+    def forget(self, company_id: int):
+        """
+        Drops the company's entry and queues it for the next run.
+        """
+        with self._lock:
+            self.companies.pop(company_id, None)
+            self.pending.add(company_id)
+
+    def drop(self, company_id: int):
+        """
+        Removes the company from the state entirely
+        (e.g. it no longer carries the tag).
+        """
+        with self._lock:
+            self.companies.pop(company_id, None)
+            self.pending.discard(company_id)
+
+    def forget_lead(self, lead_id: int):
+        for company_id in self.lead_owners().get(lead_id, []):
+            self.forget(company_id)
+
+    def lead_owners(self) -> Dict[int, List[int]]:
+        """
+        Maps recorded lead ID → company IDs.
+        """
+        owners = {}
+        with self._lock:
+            for company_id, (_, lead_id) in self.companies.items():
+                owners.setdefault(lead_id, []).append(company_id)
+        return owners
+
+    # ---------- disk ----------
+
+    def load(self) -> "SyncState":
+        """
+        Reads the state file; a missing or broken
+        file leaves the state empty (full pass).
+        """
+        self.reset()
+
+        if not self.path.exists():
+            return self
+
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.high_water = data["high_water"]
+            self.companies = {int(k): v for k, v in data["companies"].items()}
+            self.pending = set(data.get("pending", []))
+        except (ValueError, KeyError) as e:
+            print(f"Sync state ignored: {e}")
+            self.reset()
+
+        return self
+
+    def reset(self):
+        with self._lock:
+            self.high_water = None
+            self.companies = {}
+            self.pending = set()
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({
+                "high_water": self.high_water,
+                "companies": self.companies,
+                "pending": sorted(self.pending),
+            })
+
+        # Written through a temp file so a crash never leaves half a state
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(data, encoding="utf-8")
+        tmp.replace(self.path)
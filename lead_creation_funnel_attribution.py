@@ -11,10 +11,27 @@ Main features:
 - Lead creation or stage update
 - Custom field mapping
 - DRY RUN mode support
+- Concurrent, rate-limited processing
+- Incremental mode driven by updated_at (--incremental)
 """
 
-import os
-from amocrm.v2 import Company, Lead, Contact, tokens, custom_field
+import time
+import argparse
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Set
+
+from amocrm.v2 import Company, Lead, Contact, Tag
+from amocrm.v2.filters import RangeFilter, SingleFilter, SingleListFilter
+from amocrm.v2.interaction import GenericInteraction
+
+from amo_cache import EntityCache
+from amo_executor import WORKERS, RequestExecutor, configure
+from field_mapping import FieldMapper
+from funnel_state import STATE_PATH, SyncState
 
 
 # ======================
@@ -25,16 +42,11 @@ from amocrm.v2 import Company, Lead, Contact, tokens, custom_field
 # Credentials must be stored in environment variables.
 # Never hardcode secrets in public repositories.
 
-tokens.default_token_manager(
-    client_id=os.getenv("AMO_CLIENT_ID"),
-    client_secret=os.getenv("AMO_CLIENT_SECRET"),
-    subdomain=os.getenv("AMO_SUBDOMAIN"),
-    redirect_url=os.getenv("AMO_REDIRECT_URL"),
-    storage=tokens.FileTokensStorage()
-)
+# Tokens are read from AMO_CLIENT_ID, AMO_CLIENT_SECRET,
+# AMO_SUBDOMAIN and AMO_REDIRECT_URL on first use (amo_auth).
 
 # Initialize OAuth (run once manually)
-# tokens.default_token_manager.init(code=os.getenv("AMO_AUTH_CODE"))
+# python amo_auth.py --code <AMO_AUTH_CODE>
 
 
 TAG_NAME = "yandex_car_washing"
@@ -47,6 +59,30 @@ DRY_RUN = False
 # Status IDs considered as closed
 CLOSED_STATUS_IDS = {142, 143}
 
+# Lead IDs per filtered prefetch request (API page limit)
+LEAD_PREFETCH_CHUNK = 250
+
+# Companies held in memory and processed together
+COMPANY_CHUNK = 250
+
+# Contact → company links per batched link request
+LINK_BATCH_SIZE = 100
+
+# Leads per bulk stage-move PATCH
+STAGE_MOVE_BATCH_SIZE = 250
+
+# Seconds re-read before the high-water mark in incremental
+# mode, covering clock skew and late index updates
+SYNC_OVERLAP = 60
+
+batch_api = GenericInteraction()
+
+# Entities fetched during the run (companies, contacts, leads)
+entity_cache = EntityCache()
+
+# Incremental sync state, loaded by main() with --incremental
+sync_state = SyncState()
+
 # Mapping: Company custom field ID → Lead/Contact custom field ID
 FIELD_MAPPING = {
     964013: 964089,  # URL
@@ -58,6 +94,9 @@ FIELD_MAPPING = {
     964361: 964363,  # Company name
 }
 
+# FIELD_MAPPING compiled once, applied in one pass per company
+field_mapper = FieldMapper(FIELD_MAPPING)
+
 
 # ======================
 # HELPER FUNCTIONS
@@ -76,40 +115,281 @@ def company_has_exact_tag(company: Company, tag_name: str) -> bool:
         return False
 
 
-def get_field_value(entity, field_id: int):
+def find_tag_id(tag_name: str) -> int | None:
     """
-    Extracts custom field value by field ID.
+    Resolves a company tag name to its ID.
     """
-    try:
-        fields = entity._init_data.get("custom_fields_values") or []
-        for field in fields:
-            if field.get("field_id") == field_id:
-                values = field.get("values") or []
-                if values:
-                    return values[0].get("value")
-    except Exception as e:
-        print(f"Field extraction error ({field_id}): {e}")
+    for tag in Tag.companies.filter(filters=(SingleFilter("name")(tag_name),)):
+        if tag.name.lower() == tag_name.lower():
+            return tag.id
     return None
 
 
-def get_open_lead_for_company(company: Company) -> Lead | None:
+def iter_tagged_companies(tag_name: str, updated_since: int | None = None,
+                          updated_until: int | None = None) -> Iterator[Company]:
+    """
+    Lazily pages through companies filtered by tag on the
+    API side. The exact-match check is kept as a local pass,
+    since the API filter is not guaranteed to be exact.
+    With updated_since only companies updated in the
+    [updated_since, updated_until] window are returned.
+    """
+    tag_id = find_tag_id(tag_name)
+    if tag_id is None:
+        print(f"Tag '{tag_name}' not found")
+        return
+
+    filters = [SingleListFilter("tags")(tag_id)]
+    if updated_since is not None:
+        filters.append(RangeFilter("updated_at")(updated_since, updated_until))
+
+    for company in Company.objects.filter(filters=tuple(filters)):
+        if company_has_exact_tag(company, tag_name):
+            # List responses carry full company data
+            entity_cache.put(company)
+            yield company
+
+
+def iter_chunks(items: Iterable, size: int) -> Iterator[list]:
+    """
+    Groups an iterable into lists of at most `size` items.
+    """
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def iter_companies_by_id(company_ids: Iterable[int], tag_name: str) -> Iterator[Company]:
+    """
+    Fetches companies by ID, one filtered list call per
+    COMPANY_CHUNK IDs. Companies that lost the tag are
+    dropped from the sync state.
+    """
+    for ids in iter_chunks(sorted(company_ids), COMPANY_CHUNK):
+        for company in Company.objects.filter(filters=(SingleListFilter("id")(ids),)):
+            if company_has_exact_tag(company, tag_name):
+                entity_cache.put(company)
+                yield company
+            else:
+                sync_state.drop(company.id)
+
+
+def forget_moved_leads(updated_since: int, updated_until: int):
+    """
+    Scans leads updated in the window and forgets companies
+    whose recorded lead left the target stage. Lead changes
+    don't touch the company's updated_at.
+    """
+    owners = sync_state.lead_owners()
+    if not owners:
+        return
+
+    leads = Lead.objects.filter(filters=(RangeFilter("updated_at")(updated_since, updated_until),))
+    for lead in leads:
+        if lead.id not in owners:
+            continue
+        if (lead._data.get("pipeline_id") != PIPELINE_ID
+                or lead._data.get("status_id") != STATUS_ID):
+            sync_state.forget_lead(lead.id)
+
+
+def iter_changed_companies(tag_name: str, updated_since: int, updated_until: int) -> Iterator[Company]:
+    """
+    Yields companies that may need work since the last run:
+    tagged companies updated in the window, companies whose
+    lead moved and companies that failed before.
+    """
+    forget_moved_leads(updated_since, updated_until)
+
+    seen = set()
+    for company in iter_companies_by_id(set(sync_state.pending), tag_name):
+        seen.add(company.id)
+        yield company
+
+    for company in iter_tagged_companies(tag_name, updated_since, updated_until):
+        if company.id not in seen:
+            yield company
+
+
+def get_linked_ids(entity, link_name: str) -> List[int]:
+    """
+    Returns IDs of linked entities ("leads", "contacts", ...)
+    read from the embedded data without fetching them.
+    """
+    embedded = entity._data.get("_embedded") or {}
+    return [link["id"] for link in embedded.get(link_name) or []]
+
+
+def fetch_leads(lead_ids: List[int]) -> List[Lead]:
+    """
+    Fetches leads by ID with a single filtered list call.
+    """
+    return list(Lead.objects.filter(filters=(SingleListFilter("id")(lead_ids),)))
+
+
+def build_open_lead_index(companies: List[Company], executor: RequestExecutor | None = None,
+                          failed: Set[int] | None = None) -> Dict[int, Lead]:
+    """
+    Prefetches every lead linked to the companies in bulk
+    and maps company ID → first open lead.
+
+    A failed prefetch raises, unless a failed set is given:
+    then IDs of companies whose leads could not be fetched
+    are added to it and left out of the index. Such companies
+    must not be processed, they would look lead-less.
+    """
+    links = {company.id: get_linked_ids(company, "leads") for company in companies}
+    lead_ids = sorted({lead_id for ids in links.values() for lead_id in ids})
+
+    chunks = [
+        lead_ids[i:i + LEAD_PREFETCH_CHUNK]
+        for i in range(0, len(lead_ids), LEAD_PREFETCH_CHUNK)
+    ]
+
+    if executor:
+        results = executor.map(fetch_leads, chunks)
+    else:
+        results = ((chunk, fetch_leads(chunk), None) for chunk in chunks)
+
+    leads = {}
+    missing = set()
+    for chunk, fetched, error in results:
+        if error is not None:
+            if failed is None:
+                raise error
+            print(f"Lead prefetch error ({len(chunk)} leads): {error}")
+            missing.update(chunk)
+            continue
+        for lead in fetched:
+            leads[lead.id] = lead
+
+    index = {}
+    for company_id, ids in links.items():
+        if missing.intersection(ids):
+            failed.add(company_id)
+            continue
+        for lead_id in ids:
+            lead = leads.get(lead_id)
+            if lead is not None and lead._data.get("status_id") not in CLOSED_STATUS_IDS:
+                index[company_id] = lead
+                break
+
+    return index
+
+
+def get_open_lead_for_company(company: Company, open_leads: Dict[int, Lead] | None = None) -> Lead | None:
     """
     Returns the first open lead linked to the company.
+    Reads from a prefetched index when one is given.
+    A failed lookup raises: None would mean "create a lead".
     """
-    try:
-        if not hasattr(company, 'leads') or not company.leads:
-            return None
+    if open_leads is None:
+        open_leads = build_open_lead_index([company])
+    return open_leads.get(company.id)
+
 
-        for lead_link in company.leads:
-            lead = Lead.objects.get(object_id=lead_link.id)
+def build_custom_fields(company: Company) -> List[dict]:
+    """
+    Builds Lead/Contact custom_fields_values copied
+    from the company according to FIELD_MAPPING.
+    """
+    return field_mapper.build(company._data)
 
-            if lead.status.id not in CLOSED_STATUS_IDS:
-                return lead
 
-    except Exception as e:
-        print(f"Lead search error: {e}")
+class BatchQueue:
+    """
+    Collects entity payloads and sends them in chunks
+    through a single batched API endpoint.
 
-    return None
+    add() returns a Future per item that resolves once its
+    batch was sent, or fails with the batch error. Inside
+    track() the futures of items added by the current thread
+    are collected, so a caller can confirm its own items.
+    """
+
+    def __init__(self, method: str, path: str, batch_size: int, on_sent=None, on_error=None):
+        self.method = method
+        self.path = path
+        self.batch_size = batch_size
+        self.sent = 0
+        self.errors = 0
+        self._on_sent = on_sent
+        self._on_error = on_error
+        self._pending = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def add(self, item: dict) -> Future:
+        future = Future()
+        tracked = getattr(self._local, "futures", None)
+        if tracked is not None:
+            tracked.append(future)
+
+        with self._lock:
+            self._pending.append((item, future))
+            if len(self._pending) < self.batch_size:
+                return future
+            batch, self._pending = self._pending, []
+
+        self._send(batch)
+        return future
+
+    @contextmanager
+    def track(self) -> Iterator[List[Future]]:
+        """
+        Collects futures of items this thread adds in the block.
+        """
+        self._local.futures = []
+        try:
+            yield self._local.futures
+        finally:
+            self._local.futures = None
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+
+        for i in range(0, len(batch), self.batch_size):
+            self._send(batch[i:i + self.batch_size])
+
+    def _send(self, batch: List[tuple]):
+        items = [item for item, _ in batch]
+        try:
+            response, status = batch_api.request(self.method, self.path, data=items)
+            if status == 400:
+                raise ValueError(response)
+        except Exception as e:
+            print(f"Batch {self.method.upper()} {self.path} error ({len(batch)} items): {e}")
+            with self._lock:
+                self.errors += len(batch)
+            for item, future in batch:
+                if self._on_error:
+                    self._on_error(item)
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self.sent += len(batch)
+
+        for item, future in batch:
+            if self._on_sent:
+                self._on_sent(item)
+            future.set_result(item)
+
+
+# Contact → company links, sent through contacts/link
+contact_links = BatchQueue(
+    "post", "contacts/link", LINK_BATCH_SIZE,
+    on_sent=lambda link: entity_cache.invalidate(Company, link["to_entity_id"]),
+    on_error=lambda link: sync_state.forget(link["to_entity_id"]),
+)
+
+# Stage moves of existing leads, sent as bulk PATCH /leads
+stage_moves = BatchQueue(
+    "patch", "leads", STAGE_MOVE_BATCH_SIZE,
+    on_sent=lambda move: entity_cache.invalidate(Lead, move["id"]),
+    on_error=lambda move: sync_state.forget_lead(move["id"]),
+)
 
 
 def get_or_create_contact(company: Company) -> Contact | None:
@@ -118,79 +398,106 @@ def get_or_create_contact(company: Company) -> Contact | None:
     using company custom field data.
     """
 
-    # Check existing contacts
-    if hasattr(company, 'contacts') and company.contacts:
-        contact = Contact.objects.get(object_id=list(company.contacts)[0].id)
-        return contact
+    # Check existing contacts; only the ID is used, so
+    # the embedded link is enough and nothing is fetched
+    contact_ids = get_linked_ids(company, "contacts")
+    if contact_ids:
+        return Contact(data={"id": contact_ids[0]})
 
     # Create new contact
-    full_company = Company.objects.get(object_id=company.id)
-
-    contact = Contact(name=full_company.name)
-    contact.responsible_user = full_company.responsible_user
+    full_company = entity_cache.get(Company, company.id)
 
-    for company_field_id, contact_field_id in FIELD_MAPPING.items():
-        value = get_field_value(full_company, company_field_id)
-        if value:
-            field = custom_field.TextCustomField("", field_id=contact_field_id)
-            field.value = value
-            contact.custom_fields.append(field)
+    contact = Contact(data={
+        "name": full_company.name,
+        "responsible_user_id": full_company._data.get("responsible_user_id"),
+        "custom_fields_values": build_custom_fields(full_company),
+    })
 
     if not DRY_RUN:
         contact.save()
 
-        # Link contact to company
-        contact._init_data['_embedded'] = {
-            'companies': [{'id': full_company.id}]
-        }
-        contact.save()
+        # Contacts can't embed companies on creation,
+        # so the link goes through the batched endpoint
+        contact_links.add({
+            "entity_id": contact.id,
+            "to_entity_id": full_company.id,
+            "to_entity_type": "companies",
+        })
 
     return contact
 
 
 def create_lead_with_contact(company: Company, contact: Contact) -> Lead | None:
     """
-    Creates a new lead and links it to company and contact.
+    Creates a new lead already linked to company
+    and contact in a single request.
     """
 
-    full_company = Company.objects.get(object_id=company.id)
-
-    lead = Lead(name=f"Deal: {full_company.name}")
-    lead.responsible_user = full_company.responsible_user
+    full_company = entity_cache.get(Company, company.id)
 
-    # Copy custom fields
-    for company_field_id, lead_field_id in FIELD_MAPPING.items():
-        value = get_field_value(full_company, company_field_id)
-        if value:
-            field = custom_field.TextCustomField("", field_id=lead_field_id)
-            field.value = value
-            lead.custom_fields.append(field)
+    embedded = {"companies": [{"id": full_company.id}]}
+    if contact and contact.id:
+        embedded["contacts"] = [{"id": contact.id}]
 
-    lead._init_data['pipeline_id'] = PIPELINE_ID
-    lead._init_data['status_id'] = STATUS_ID
+    lead = Lead(data={
+        "name": f"Deal: {full_company.name}",
+        "responsible_user_id": full_company._data.get("responsible_user_id"),
+        "custom_fields_values": build_custom_fields(full_company),
+        "pipeline_id": PIPELINE_ID,
+        "status_id": STATUS_ID,
+        "_embedded": embedded,
+    })
 
     if not DRY_RUN:
         lead.save()
 
-        lead._init_data['_embedded'] = {
-            'companies': [{'id': full_company.id}],
-            'contacts': [{'id': contact.id}] if contact else []
-        }
-
-        lead.save()
+        entity_cache.invalidate(Company, full_company.id)
+        if contact:
+            entity_cache.invalidate(Contact, contact.id)
 
     return lead
 
 
-def move_lead_to_stage(lead: Lead):
+def move_lead_to_stage(lead: Lead) -> bool:
     """
-    Moves an existing lead to target pipeline stage.
+    Queues an existing lead for a bulk move to the target
+    pipeline stage. Returns False if it is already there.
     """
-    lead._init_data['pipeline_id'] = PIPELINE_ID
-    lead._init_data['status_id'] = STATUS_ID
+    if (lead._data.get("pipeline_id") == PIPELINE_ID
+            and lead._data.get("status_id") == STATUS_ID):
+        return False
 
     if not DRY_RUN:
-        lead.save()
+        stage_moves.add({
+            "id": lead.id,
+            "pipeline_id": PIPELINE_ID,
+            "status_id": STATUS_ID,
+        })
+
+    return True
+
+
+def process_company(company: Company, open_leads: Dict[int, Lead] | None = None,
+                    state: SyncState | None = None) -> str:
+    """
+    Ensures the company has a contact and an open lead
+    in the target stage. Returns "created", "moved"
+    or "skipped" (lead already in stage).
+    The result is recorded in the sync state if one is given.
+    """
+    contact = get_or_create_contact(company)
+    lead = get_open_lead_for_company(company, open_leads)
+
+    if lead:
+        outcome = "moved" if move_lead_to_stage(lead) else "skipped"
+    else:
+        lead = create_lead_with_contact(company, contact)
+        outcome = "created"
+
+    if state is not None and contact and contact.id and lead and lead.id:
+        state.mark(company.id, contact.id, lead.id)
+
+    return outcome
 
 
 # ======================
@@ -200,46 +507,137 @@ def move_lead_to_stage(lead: Lead):
 def main():
     """
     Main execution flow:
-    - Load all companies
-    - Filter by tag
+    - Page through companies filtered by tag
+      (only changed ones with --incremental)
+    - Prefetch linked leads per chunk
     - Ensure contact exists
     - Create or update lead
     """
 
+    parser = argparse.ArgumentParser(description="Tagged companies → contacts and leads in the target stage")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only process companies and leads updated since the last run")
+    parser.add_argument("--reset", action="store_true",
+                        help="Discard the sync state and rebuild it with a full pass")
+    parser.add_argument("--state", default=str(STATE_PATH),
+                        help="Incremental sync state file")
+    args = parser.parse_args()
+
     print("Starting amoCRM automation...")
     print(f"Mode: {'DRY RUN' if DRY_RUN else 'LIVE'}")
 
     processed = 0
     created = 0
-    updated = 0
-
-    all_companies = list(Company.objects.all())
+    moved = 0
+    skipped = 0
+    unchanged = 0
+    errors = 0
+
+    configure(workers=WORKERS)
+    entity_cache.clear()
+
+    state = None
+    if args.incremental or args.reset:
+        sync_state.path = Path(args.state)
+        sync_state.load()
+        if args.reset:
+            sync_state.reset()
+        state = sync_state
+
+    # Upper bound of this run's window, next run's high-water mark
+    until = int(time.time())
+
+    if state is not None and state.high_water is not None:
+        since = state.high_water - SYNC_OVERLAP
+        print(f"Incremental sync: changes since {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(since))}, "
+              f"{len(state)} companies in sync")
+        companies_iter = iter_changed_companies(TAG_NAME, since, until)
+    else:
+        companies_iter = iter_tagged_companies(TAG_NAME)
+
+    completed = False
 
-    companies_with_tag = [
-        comp for comp in all_companies
-        if company_has_exact_tag(comp, TAG_NAME)
-    ]
-
-    print(f"Companies with tag '{TAG_NAME}': {len(companies_with_tag)}")
-
-    for company in companies_with_tag:
-        processed += 1
-        print(f"\nProcessing company {company.id} — {company.name}")
-
-        contact = get_or_create_contact(company)
-        lead = get_open_lead_for_company(company)
-
-        if lead:
-            move_lead_to_stage(lead)
-            updated += 1
-        else:
-            create_lead_with_contact(company, contact)
-            created += 1
+    try:
+        with RequestExecutor(WORKERS) as executor:
+            for companies in iter_chunks(companies_iter, COMPANY_CHUNK):
+                if state is not None:
+                    # Unchanged companies cost nothing: no lead prefetch, no processing
+                    todo = [
+                        company for company in companies
+                        if not state.is_synced(company.id, get_linked_ids(company, "contacts"),
+                                               get_linked_ids(company, "leads"))
+                    ]
+                    unchanged += len(companies) - len(todo)
+                    companies = todo
+                    if not companies:
+                        continue
+
+                failed = set()
+                open_leads = build_open_lead_index(companies, executor, failed)
+
+                if failed:
+                    # Unknown leads: retried next run rather than duplicated
+                    for company in companies:
+                        if company.id in failed:
+                            processed += 1
+                            errors += 1
+                            print(f"\nProcessing company {company.id} — {company.name}")
+                            print("Company processing error: leads could not be fetched")
+                            if state is not None:
+                                state.forget(company.id)
+                    companies = [company for company in companies if company.id not in failed]
+
+                def process(company):
+                    return process_company(company, open_leads, state)
+
+                for company, outcome, error in executor.map(process, companies):
+                    processed += 1
+                    print(f"\nProcessing company {company.id} — {company.name}")
+
+                    if error is not None:
+                        errors += 1
+                        print(f"Company processing error: {error}")
+                        if state is not None:
+                            state.forget(company.id)
+                    elif outcome == "moved":
+                        moved += 1
+                    elif outcome == "skipped":
+                        skipped += 1
+                    else:
+                        created += 1
+
+                if not DRY_RUN:
+                    # Links and moves go out per chunk, so an interrupted
+                    # run leaves no unlinked contacts behind
+                    contact_links.flush()
+                    stage_moves.flush()
+
+        completed = True
+
+    finally:
+        if not DRY_RUN:
+            contact_links.flush()
+            stage_moves.flush()
+
+            # Failed companies stay pending, so the mark can advance
+            # after a full pass; an interrupted run only saves marks
+            if state is not None:
+                if completed:
+                    state.high_water = until
+                state.save()
 
     print("\nSummary:")
     print(f"Processed: {processed}")
+    if state is not None:
+        print(f"Unchanged (in sync): {unchanged}")
     print(f"Created leads: {created}")
-    print(f"Updated leads: {updated}")
+    print(f"Moved leads: {moved} (sent: {stage_moves.sent}, errors: {stage_moves.errors})")
+    print(f"Leads already in stage: {skipped}")
+    print(f"Errors: {errors}")
+    print(f"Contacts linked: {contact_links.sent} (errors: {contact_links.errors})")
+    print(f"Entity cache: {entity_cache.hits} hits, {entity_cache.misses} misses")
+    if state is not None and not DRY_RUN:
+        print(f"Sync state: {len(state)} companies, {len(state.pending)} pending")
     print("Done.")
 
 
@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+
+"""
+Field Normalization
+
+Canonical forms of the organization fields used for matching
+and dedup: phones, URLs / website domains, addresses, names,
+working hours and city matching. Shared by the scraper, the
+dedup stage and the CRM importer.
+
+Features:
+- Scalar functions for single rows (card extraction)
+- Column versions over whole DataFrames / Arrow tables
+  (normalize_frame) with the same results
+- One precompiled pattern per city for address filtering
+"""
+
+import re
+from functools import lru_cache
+from typing import Callable, Dict, List
+
+import pandas as pd
+
+from crm_schema import COLUMNS
+
+
+def _missing(value) -> bool:
+    """
+    None, NaN / NA cells and blank strings.
+    """
+    if isinstance(value, str):
+        return not value.strip()
+    return value is None or bool(pd.isna(value))
+
+
+# =============================
+# PHONES
+# =============================
+
+_NON_DIGITS_RE = re.compile(r"\D")
+_EXTENSION = r"(?:доб|ext|вн)\.?.*$"
+_EXTENSION_RE = re.compile(_EXTENSION)
+
+# Whole number written by a float cell: 79161234567.0
+_FLOAT_TAIL = r"^(\+?\d+)\.0+$"
+_FLOAT_TAIL_RE = re.compile(_FLOAT_TAIL)
+
+
+def _phone_text(phone) -> str:
+    """
+    Trimmed phone text; numbers read from spreadsheet
+    float cells lose their ".0".
+    """
+    if isinstance(phone, float) and phone.is_integer():
+        return str(int(phone))
+    return _FLOAT_TAIL_RE.sub(r"\1", str(phone).strip())
+
+
+def normalize_phone(phone) -> str | None:
+    """
+    Keeps digits only, in 7XXXXXXXXXX form for Russian numbers.
+    """
+    if _missing(phone):
+        return None
+    digits = _NON_DIGITS_RE.sub("", _EXTENSION_RE.sub("", _phone_text(phone).lower()))
+    if len(digits) == 11 and digits.startswith("8"):
+        digits = "7" + digits[1:]
+    elif len(digits) == 10:
+        digits = "7" + digits
+    return digits or None
+
+
+def phone_e164(phone) -> str | None:
+    """
+    E.164 form (+79991234567); None for numbers that
+    are too short or too long to be valid.
+    """
+    digits = normalize_phone(phone)
+    if not digits or not 11 <= len(digits) <= 15:
+        return None
+    return "+" + digits
+
+
+def canonical_phone(phone) -> str | None:
+    """
+    E.164 form when valid, otherwise the trimmed input
+    (extensions, short service numbers are kept as is).
+    """
+    if _missing(phone):
+        return None
+    phone = _phone_text(phone)
+    if _EXTENSION_RE.search(phone.lower()):
+        return phone
+    return phone_e164(phone) or phone
+
+
+# =============================
+# URLS AND DOMAINS
+# =============================
+
+_SCHEME_RE = re.compile(r"^[a-z][a-z0-9+.-]*://")
+_ORG_ID_RE = re.compile(r"/org/(?:[^/]+/)?(\d+)")
+
+# Hosts shared by many organizations: the first path
+# segment (the page or account) is part of the key
+SHARED_HOSTS = {
+    "vk.com", "vk.ru", "ok.ru", "instagram.com", "facebook.com", "t.me", "wa.me",
+    "taplink.cc", "taplink.ws", "yandex.ru", "2gis.ru", "avito.ru", "youtube.com",
+}
+
+
+def normalize_url(url) -> str | None:
+    """
+    Lowercases and strips scheme, "www.", query,
+    fragment and trailing slash.
+    """
+    if _missing(url):
+        return None
+    url = _SCHEME_RE.sub("", str(url).strip().lower())
+    url = url.split("#")[0].split("?")[0].rstrip("/")
+    if url.startswith("www."):
+        url = url[4:]
+    return url or None
+
+
+def website_domain(url) -> str | None:
+    """
+    Host of a website without "www." (site.ru), or
+    host/page for shared hosts (vk.com/carwash).
+    """
+    url = normalize_url(url)
+    if not url:
+        return None
+    host, _, path = url.partition("/")
+    host = host.split(":")[0]
+    if host in SHARED_HOSTS:
+        page = path.split("/")[0]
+        return f"{host}/{page}" if page else None
+    return host or None
+
+
+def org_id(url) -> str | None:
+    """
+    Organization ID from a map card URL
+    (yandex.ru/maps/org/<slug>/<id>/).
+    """
+    if _missing(url):
+        return None
+    match = _ORG_ID_RE.search(str(url))
+    return match.group(1) if match else None
+
+
+# =============================
+# ADDRESSES AND NAMES
+# =============================
+
+_ADDRESS_ABBREVIATIONS = [
+    (r"\bулица\b|\bул\b", "ул"),
+    (r"\bпроспект\b|\bпросп\b|\bпр-т\b|\bпр-кт\b", "пр"),
+    (r"\bпереулок\b|\bпер\b", "пер"),
+    (r"\bшоссе\b|\bш\b", "ш"),
+    (r"\bбульвар\b|\bб-р\b|\bбул\b", "бр"),
+    (r"\bплощадь\b|\bпл\b", "пл"),
+    (r"\bнабережная\b|\bнаб\b", "наб"),
+    (r"\bпроезд\b|\bпр-д\b", "прд"),
+    (r"\bдом\b|\bд\b", ""),
+    (r"\bстроение\b|\bстр\b|\bс\b", "с"),
+    (r"\bкорпус\b|\bкорп\b|\bк\b", "к"),
+    (r"\bвладение\b|\bвлд\b|\bвл\b", "вл"),
+    (r"\bгород\b|\bг\b", ""),
+]
+_ADDRESS_ABBREVIATIONS_RE = [(re.compile(p), r) for p, r in _ADDRESS_ABBREVIATIONS]
+
+# "16 с 2" → "16с2", "45 к 1" → "45к1", "12 а" → "12а"
+_BUILDING_RE = re.compile(r"(\d+)\s*(с|к)\s*(\d+)")
+_HOUSE_LETTER_RE = re.compile(r"(\d+)\s+([а-я])\b")
+
+_POSTCODE_RE = re.compile(r"\b\d{6}\b")
+_COUNTRY_RE = re.compile(r"\bроссия\b")
+_PUNCT_RE = re.compile(r"[^\w\s-]|_")
+_SPACES_RE = re.compile(r"\s+")
+
+# Words that describe the business type rather than name it
+GENERIC_NAME_WORDS = {
+    "автомойка", "мойка", "автомоечный", "комплекс", "детейлинг", "центр", "студия",
+    "ооо", "ип", "ао", "зао", "оао", "самообслуживания", "ручная", "автосервис",
+}
+
+
+def _clean(text: str) -> str:
+    text = str(text).lower().replace("ё", "е")
+    text = _PUNCT_RE.sub(" ", text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+def normalize_address(address) -> str | None:
+    """
+    Lowercase address without country, postcode and
+    punctuation, with street-type and building words
+    unified (улица → ул, строение → с, дом dropped).
+    """
+    if _missing(address):
+        return None
+    text = _POSTCODE_RE.sub(" ", str(address).lower())
+    text = _COUNTRY_RE.sub(" ", text)
+    text = _clean(text)
+    for pattern, replacement in _ADDRESS_ABBREVIATIONS_RE:
+        text = pattern.sub(replacement, text)
+    text = _BUILDING_RE.sub(r"\1\2\3", text)
+    text = _HOUSE_LETTER_RE.sub(r"\1\2", text)
+    return _SPACES_RE.sub(" ", text).strip() or None
+
+
+def normalize_name(name) -> str | None:
+    """
+    Lowercase name without punctuation and
+    generic business-type words.
+    """
+    if _missing(name):
+        return None
+    words = [w for w in _clean(name).split() if w not in GENERIC_NAME_WORDS]
+    return " ".join(words) or None
+
+
+# =============================
+# WORKING HOURS
+# =============================
+
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+DAY_CODES = {"Mo": "Mon", "Tu": "Tue", "We": "Wed", "Th": "Thu", "Fr": "Fri", "Sa": "Sat", "Su": "Sun"}
+
+_DAY_RANGE_RE = re.compile(r"^(\w+)[–-](\w+)$")
+
+
+def _day(name: str) -> str:
+    return DAY_CODES.get(name, name)
+
+
+def compact_hours(entries: List[str]) -> str | None:
+    """
+    Converts openingHours entries ("Mo 09:00-21:00") into
+    day ranges with equal hours: "Mon–Fri 09:00-21:00; Sat–Sun 10:00-18:00".
+    Entries may already be ranges ("Mo-Fr 09:00-21:00").
+    """
+    days = []
+    for entry in entries:
+        parts = str(entry).split()
+        if len(parts) != 2:
+            continue
+        day, hours = parts
+        match = _DAY_RANGE_RE.match(day)
+        if match and _day(match.group(1)) in DAYS and _day(match.group(2)) in DAYS:
+            first, last = DAYS.index(_day(match.group(1))), DAYS.index(_day(match.group(2)))
+            days.extend((DAYS[i], hours) for i in range(first, last + 1))
+        else:
+            days.append((_day(day), hours))
+
+    if not days:
+        return None
+
+    # Consecutive weekdays with the same hours form one range
+    groups = []
+    for day, hours in days:
+        if (groups and groups[-1][2] == hours and day in DAYS and groups[-1][1] in DAYS
+                and DAYS.index(day) == DAYS.index(groups[-1][1]) + 1):
+            groups[-1][1] = day
+        else:
+            groups.append([day, day, hours])
+
+    return "; ".join(
+        f"{first} {hours}" if first == last else f"{first}–{last} {hours}"
+        for first, last, hours in groups
+    )
+
+
+def compact_hours_text(text) -> str | None:
+    """
+    Re-compacts an already formatted value
+    ("Mon 09:00-21:00; Tue 09:00-21:00; ...").
+    Values that are not day/hours lists (24/7,
+    free text) are returned unchanged.
+    """
+    if _missing(text):
+        return None
+    text = str(text).strip()
+    entries = [e.strip() for e in text.split(";") if e.strip()]
+    if any(len(e.split()) != 2 for e in entries):
+        return text
+    return compact_hours(entries) or text
+
+
+# =============================
+# CITY MATCHING
+# =============================
+
+# Explicit letter class instead of \b: Arrow string columns use
+# RE2, whose \b only knows ASCII letters
+_WORD_CHARS = "0-9a-zа-яё_"
+
+
+@lru_cache(maxsize=None)
+def city_pattern(city: str) -> str:
+    """
+    Pattern matching the city as a whole word in a lowercased address.
+    """
+    return rf"(?:^|[^{_WORD_CHARS}]){re.escape(city.strip().lower())}(?:[^{_WORD_CHARS}]|$)"
+
+
+@lru_cache(maxsize=None)
+def _city_regex(city: str) -> re.Pattern:
+    return re.compile(city_pattern(city))
+
+
+def address_in_city(address: str, city: str) -> bool:
+    """
+    Checks whether the city name is present in the address.
+    """
+    return _city_regex(city).search(str(address).lower()) is not None
+
+
+# =============================
+# COLUMNS
+# =============================
+
+def _strings(values: pd.Series) -> pd.Series:
+    """
+    Arrow-backed string column, so str methods run
+    as Arrow compute kernels instead of per-cell Python.
+    """
+    values = values.astype("string[pyarrow]").str.strip()
+    return values.mask(values == "")
+
+
+def _map_unique(values: pd.Series, fn: Callable) -> pd.Series:
+    """
+    Applies a scalar function once per distinct value;
+    hours and city names repeat across most rows.
+    """
+    codes, uniques = pd.factorize(values)
+    mapped = pd.array([fn(value) for value in uniques], dtype="string[pyarrow]")
+    return pd.Series(mapped.take(codes, allow_fill=True), index=values.index)
+
+
+def phone_column(values: pd.Series) -> pd.Series:
+    """
+    canonical_phone over a column.
+    """
+    values = _strings(values).str.replace(_FLOAT_TAIL, r"\1", regex=True)
+    digits = values.str.replace(r"\D", "", regex=True)
+    length = digits.str.len()
+
+    digits = digits.mask((length == 11) & digits.str.startswith("8"), "7" + digits.str.slice(1))
+    digits = digits.mask(length == 10, "7" + digits)
+    length = digits.str.len()
+
+    valid = (length >= 11) & (length <= 15) & ~values.str.lower().str.contains(_EXTENSION, regex=True)
+    return ("+" + digits).where(valid.fillna(False), values)
+
+
+def website_column(values: pd.Series) -> pd.Series:
+    """
+    website_domain over a column: the matching key,
+    not a value to store.
+    """
+    url = _strings(values).str.lower()
+    url = url.str.replace(r"^[a-z][a-z0-9+.-]*://", "", regex=True)
+    url = url.str.replace(r"[?#].*$", "", regex=True).str.replace(r"/+$", "", regex=True)
+    url = url.str.replace(r"^www\.", "", regex=True)
+
+    parts = url.str.extract(r"^([^/:]*)(?::[^/]*)?(?:/([^/]*))?")
+    host, page = parts[0].mask(parts[0] == ""), parts[1].mask(parts[1] == "")
+
+    shared = host.isin(SHARED_HOSTS)
+    return host.where(~shared, (host + "/" + page).where(page.notna()))
+
+
+def hours_column(values: pd.Series) -> pd.Series:
+    """
+    compact_hours_text over a column.
+    """
+    return _map_unique(_strings(values), compact_hours_text)
+
+
+def city_mask(addresses: pd.Series, cities: pd.Series | str) -> pd.Series:
+    """
+    True where the address contains its row's city.
+    One pattern per distinct city, matched over
+    all of that city's rows at once.
+    """
+    addresses = _strings(addresses).str.lower()
+    if isinstance(cities, str):
+        return addresses.str.contains(city_pattern(cities), regex=True).fillna(False).astype(bool)
+
+    cities = _strings(cities)
+    mask = pd.Series(False, index=addresses.index)
+    for city in cities.dropna().unique():
+        rows = (cities == city).fillna(False)
+        mask[rows] = addresses[rows].str.contains(city_pattern(city), regex=True).fillna(False)
+    return mask
+
+
+# Canonical column key → column normalizer. Websites are only
+# trimmed: the stored URL keeps its path, website_domain /
+# website_column give the matching key.
+COLUMN_NORMALIZERS: Dict[str, Callable] = {
+    "phone": phone_column,
+    "website": _strings,
+    "working_hours": hours_column,
+}
+
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalizes phone and working hours columns and trims
+    websites, for a frame with scraper or importer headers.
+    """
+    df = df.copy()
+    for column in COLUMNS:
+        normalizer = COLUMN_NORMALIZERS.get(column.key)
+        if normalizer is None:
+            continue
+        for header in {column.scraped, column.imported}:
+            if header and header in df.columns:
+                df[header] = normalizer(df[header])
+    return df
+
+
+def normalize_table(table):
+    """
+    normalize_frame for a pyarrow Table.
+    """
+    import pyarrow as pa
+
+    return pa.Table.from_pandas(normalize_frame(table.to_pandas()), preserve_index=False)
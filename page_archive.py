@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""
+Raw Page Archive
+
+Content-addressed store of fetched organization pages, so new
+fields can be extracted later without crawling again.
+
+Each page is a gzip file named by the SHA-1 of its URL
+(<root>/<2 hex chars>/<sha1>.html.gz). The first line holds a
+JSON header (url, category, city, saved_at), the rest is the
+page HTML. Saving the same URL again replaces the page.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Tuple
+
+
+# gzip level; higher levels cost much more CPU for little size gain on HTML
+COMPRESS_LEVEL = 6
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def read_page(path: Path | str) -> Tuple[dict, str]:
+    """
+    Returns (header, html) of an archived page.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        return header, f.read()
+
+
+def read_header(path: Path | str) -> dict:
+    """
+    Returns the header of an archived page without
+    decompressing the HTML.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.loads(f.readline())
+
+
+class PageArchive:
+    """
+    Usage:
+        archive = PageArchive("yandex_result/pages")
+        archive.save(url, html, category="Автомойка", city="Москва")
+        header, html = archive.load(url)
+    """
+
+    def __init__(self, root: Path | str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.saved = 0
+        self._lock = threading.Lock()
+
+    def path_for(self, url: str) -> Path:
+        digest = url_hash(url)
+        return self.root / digest[:2] / f"{digest}.html.gz"
+
+    def __contains__(self, url: str) -> bool:
+        return self.path_for(url).exists()
+
+    def save(self, url: str, html: str, category: str | None = None, city: str | None = None):
+        """
+        Writes the page atomically (temp file + rename),
+        so readers never see a partial file.
+        """
+        path = self.path_for(url)
+        path.parent.mkdir(exist_ok=True)
+
+        header = {
+            "url": url,
+            "category": category,
+            "city": city,
+            "saved_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        data = (json.dumps(header, ensure_ascii=False) + "\n" + html).encode("utf-8")
+
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(gzip.compress(data, compresslevel=COMPRESS_LEVEL))
+        tmp.replace(path)
+
+        with self._lock:
+            self.saved += 1
+
+    def load(self, url: str) -> Tuple[dict, str] | None:
+        path = self.path_for(url)
+        return read_page(path) if path.exists() else None
+
+    def paths(self) -> Iterator[Path]:
+        """
+        Archived page files, in a stable order.
+        """
+        return iter(sorted(self.root.glob("*/*.html.gz")))
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""
+Offline Re-parse
+
+Re-runs card extraction over the raw page archive written by
+yandex_maps_parsing --archive, with no browser and no network.
+Pages are decompressed and parsed in a process pool across all
+cores; rows use the scraper's column schema. --city and
+--category are matched against page headers, so other pages
+are never parsed.
+
+Usage:
+    python reparse.py yandex_result/pages -o reparsed.csv
+    python reparse.py yandex_result/pages --city Москва --filter-address --format xlsx -o moscow.xlsx
+"""
+
+import argparse
+from pathlib import Path
+from typing import Iterator, Tuple
+
+from card_extract import extract_row, has_card_markup, map_pages, parse_html
+from crm_schema import SCRAPED_COLUMNS
+from page_archive import PageArchive, read_header, read_page
+from row_sinks import FORMATS, open_sink
+
+
+def reparse_page(args: Tuple[str, bool]) -> Tuple[str, dict | None]:
+    """
+    Returns (URL, row or None) for one archived page.
+    """
+    path, filter_address = args
+    header, html = read_page(path)
+
+    doc = parse_html(html)
+    if not has_card_markup(doc):
+        return header["url"], None
+
+    return header["url"], extract_row(
+        doc, header["url"], header.get("city") or "", header.get("category") or "", filter_address
+    )
+
+
+def reparse_archive(root: Path | str, filter_address: bool = False, workers: int | None = None,
+                    city: str | None = None, category: str | None = None) -> Iterator[Tuple[str, dict | None]]:
+    """
+    Yields (URL, row or None) for every archived page,
+    or only pages whose header matches city / category.
+    """
+    paths = PageArchive(root).paths()
+
+    if city or category:
+        paths = (
+            path for path in paths
+            if _header_matches(read_header(path), city, category)
+        )
+
+    jobs = ((str(path), filter_address) for path in paths)
+    return map_pages(reparse_page, jobs, workers)
+
+
+def _header_matches(header: dict, city: str | None, category: str | None) -> bool:
+    return (not city or header.get("city") == city) and (not category or header.get("category") == category)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-extract rows from the raw page archive")
+    parser.add_argument("archive", help="Archive directory (yandex_maps_parsing --archive)")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes (default: CPU count)")
+    parser.add_argument("--filter-address", action="store_true",
+                        help="Skip addresses outside the page's city")
+    parser.add_argument("--city", help="Only pages scraped for this city")
+    parser.add_argument("--category", help="Only pages scraped for this category")
+    args = parser.parse_args()
+
+    skipped = 0
+
+    with open_sink(Path(args.output), args.format, SCRAPED_COLUMNS) as sink:
+        for url, row in reparse_archive(args.archive, args.filter_address, args.workers,
+                                        args.city, args.category):
+            if row is None:
+                skipped += 1
+                continue
+            sink.write(row)
+
+    print(f"Saved {sink.count} records → {args.output} ({skipped} pages without a card or outside the city)")
+
+
+if __name__ == "__main__":
+    main()
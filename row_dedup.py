@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+
+"""
+Organization Dedup
+
+Clusters scraped rows that describe the same organization
+(found under several categories or in neighbouring cities)
+and merges every cluster into one record.
+
+Features:
+- Normalized keys: map org ID, E.164 phone, website domain,
+  address (street + house block)
+- Blocking: rows are only compared with rows sharing a key,
+  looked up in an index, never all pairs
+- Incremental: rows can be added while scraping is running
+- Merged record keeps the most complete row, fills its gaps
+  from the others and lists all matched categories
+- MergingSink: drop-in row sink that writes merged records
+  to another sink (scraper output, CRM upload queue)
+
+Usage:
+    python row_dedup.py yandex_result/moscow.xlsx -o moscow_dedup.xlsx
+"""
+
+import re
+import argparse
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple
+
+from crm_schema import SCRAPED_COLUMNS
+from normalize import normalize_address, normalize_name, org_id, phone_e164, website_domain
+from row_sinks import FORMATS, RowSink, open_sink
+
+
+# =============================
+# CONFIGURATION
+# =============================
+
+# Minimum name similarity (0..1) for rows with other evidence
+NAME_SIMILARITY = 0.8
+
+# Minimum similarity of two addresses with the same house numbers
+ADDRESS_SIMILARITY = 0.85
+
+# Blocks above this size (chain call-centre phones, shared
+# domains, malls) are not compared pairwise any further
+MAX_BLOCK = 50
+
+# Separator of merged categories
+CATEGORY_SEPARATOR = "; "
+
+
+# =============================
+# KEYS AND MATCHING
+# =============================
+
+_HOUSE_RE = re.compile(r"\d+[а-яa-z]*\d*")
+_WORD_RE = re.compile(r"[а-яa-z]{3,}")
+
+# Street types as unified by normalize_address
+STREET_TYPES = {"ул", "пр", "пер", "ш", "бр", "пл", "наб", "прд", "мкр", "аллея", "линия", "тракт", "тупик"}
+
+# Words that place an address but don't name its street
+PLACE_WORDS = {
+    "область", "обл", "край", "республика", "респ", "район", "округ",
+    "поселок", "пос", "село", "деревня", "городской", "муниципальный",
+}
+
+
+class RowKeys(NamedTuple):
+    org: str | None
+    phone: str | None
+    domain: str | None
+    address: str | None
+    street: str | None      # blocking key: street word + house numbers
+    name: str | None
+
+
+def street_word(address: str, city: str | None = None) -> str | None:
+    """
+    Street name word of a normalized address: the word next
+    to a street type (ул ленина → ленина, ленинградское ш →
+    ленинградское), else the longest word that is not the
+    city or a region word, so "москва ул ленина 1" and
+    "ул ленина 1" share a key.
+    """
+    tokens = address.split()
+    for i, token in enumerate(tokens):
+        if token in STREET_TYPES:
+            for neighbour in tokens[i + 1:i + 3] + tokens[max(i - 1, 0):i]:
+                if _WORD_RE.fullmatch(neighbour):
+                    return neighbour
+
+    skip = PLACE_WORDS | set(_WORD_RE.findall(normalize_address(city) or ""))
+    words = [word for word in _WORD_RE.findall(address) if word not in skip]
+    return max(words, key=len) if words else None
+
+
+def row_keys(row: dict) -> RowKeys:
+    address = normalize_address(row.get("Address"))
+
+    street = None
+    if address:
+        houses = _HOUSE_RE.findall(address)
+        word = street_word(address, row.get("City"))
+        if houses and word:
+            street = f"{word} {' '.join(houses)}"
+
+    return RowKeys(
+        org=org_id(row.get("URL")),
+        phone=phone_e164(row.get("Phone")),
+        domain=website_domain(row.get("Website")),
+        address=address,
+        street=street,
+        name=normalize_name(row.get("Name")),
+    )
+
+
+def _similarity(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    matcher = SequenceMatcher(None, a, b)
+    return matcher.ratio() if matcher.quick_ratio() > 0 else 0.0
+
+
+def addresses_match(a: str, b: str) -> bool:
+    """
+    Same house numbers and similar text; an address that
+    is a suffix of the other (no city prefix) matches too.
+    """
+    if a == b:
+        return True
+    if _HOUSE_RE.findall(a) != _HOUSE_RE.findall(b):
+        return False
+    return a.endswith(b) or b.endswith(a) or _similarity(a, b) >= ADDRESS_SIMILARITY
+
+
+def is_duplicate(a: RowKeys, b: RowKeys, name_similarity: float = NAME_SIMILARITY) -> bool:
+    """
+    Same map card, or matching address plus one more
+    signal (phone, domain or similar name). Without an
+    address on both sides a shared phone or domain and
+    a similar name are required, so chain branches with
+    one call-centre number stay apart.
+    """
+    if a.org and a.org == b.org:
+        return True
+
+    same_contact = (a.phone and a.phone == b.phone) or (a.domain and a.domain == b.domain)
+    similar_name = bool(a.name and b.name and _similarity(a.name, b.name) >= name_similarity)
+
+    if a.address and b.address:
+        return addresses_match(a.address, b.address) and bool(same_contact or similar_name)
+
+    return bool(same_contact and similar_name)
+
+
+# =============================
+# DEDUPER
+# =============================
+
+class RowDeduper:
+    """
+    Incremental clustering of rows with union-find.
+
+    Usage:
+        deduper = RowDeduper()
+        for row in rows:
+            deduper.add(row)
+        merged = deduper.merged()
+    """
+
+    BLOCK_KEYS = ("org", "phone", "domain", "street")
+
+    def __init__(self, name_similarity: float = NAME_SIMILARITY, max_block: int = MAX_BLOCK):
+        self.name_similarity = name_similarity
+        self.max_block = max_block
+        self.rows: List[dict] = []
+        self._keys: List[RowKeys] = []
+        self._parent: List[int] = []
+        self._blocks: Dict[tuple, List[int]] = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _find(self, i: int) -> int:
+        while self._parent[i] != i:
+            self._parent[i] = self._parent[self._parent[i]]
+            i = self._parent[i]
+        return i
+
+    def _union(self, i: int, j: int):
+        ri, rj = self._find(i), self._find(j)
+        if ri != rj:
+            # The earliest row stays the root
+            self._parent[max(ri, rj)] = min(ri, rj)
+
+    def add(self, row: dict) -> bool:
+        """
+        Adds a row; returns False if it duplicates
+        an organization added before.
+        """
+        i = len(self.rows)
+        keys = row_keys(row)
+        self.rows.append(row)
+        self._keys.append(keys)
+        self._parent.append(i)
+
+        candidates = set()
+        for kind in self.BLOCK_KEYS:
+            value = getattr(keys, kind)
+            if not value:
+                continue
+            block = self._blocks.setdefault((kind, value), [])
+            if len(block) < self.max_block:
+                candidates.update(block)
+            block.append(i)
+
+        for j in sorted(candidates):
+            if self._find(j) != self._find(i) and is_duplicate(keys, self._keys[j], self.name_similarity):
+                self._union(i, j)
+
+        return self._find(i) == i
+
+    def clusters(self) -> List[List[int]]:
+        """
+        Row indexes per organization, in order of first appearance.
+        """
+        groups = {}
+        for i in range(len(self.rows)):
+            groups.setdefault(self._find(i), []).append(i)
+        return list(groups.values())
+
+    def merged(self) -> List[dict]:
+        return [merge_rows([self.rows[i] for i in cluster]) for cluster in self.clusters()]
+
+
+def merge_rows(rows: List[dict]) -> dict:
+    """
+    Most complete row with gaps filled from the others
+    and every distinct category listed.
+    """
+    if len(rows) == 1:
+        return dict(rows[0])
+
+    base = max(rows, key=lambda row: sum(1 for value in row.values() if value not in (None, "")))
+    merged = dict(base)
+
+    for row in rows:
+        for column, value in row.items():
+            if merged.get(column) in (None, "") and value not in (None, ""):
+                merged[column] = value
+
+    categories = []
+    for row in rows:
+        for category in str(row.get("Category") or "").split(CATEGORY_SEPARATOR):
+            if category and category not in categories:
+                categories.append(category)
+    merged["Category"] = CATEGORY_SEPARATOR.join(categories) or None
+
+    return merged
+
+
+class MergingSink(RowSink):
+    """
+    Wraps another sink. Rows are clustered as they arrive and
+    one merged record per organization is written to the
+    wrapped sink on close(), so duplicates found late (another
+    category or city) are still merged. count is rows received;
+    the wrapped sink counts organizations.
+
+    Usage:
+        with MergingSink(open_sink(path, "csv", SCRAPED_COLUMNS)) as sink:
+            for row in rows:
+                sink.write(row)
+    """
+
+    def __init__(self, sink: RowSink, name_similarity: float = NAME_SIMILARITY):
+        super().__init__(sink.path, sink.columns)
+        self.sink = sink
+        self.deduper = RowDeduper(name_similarity)
+
+    def _write(self, row: dict):
+        self.deduper.add(row)
+
+    def close(self):
+        with self._lock:
+            merged = self.deduper.merged()
+
+        try:
+            for row in merged:
+                self.sink.write(row)
+        finally:
+            self.sink.close()
+
+
+def write_deduplicated(rows: Iterable[dict], path: Path, fmt: str) -> tuple:
+    """
+    Writes merged rows to a file. Returns (rows in, rows out).
+    """
+    with MergingSink(open_sink(path, fmt, SCRAPED_COLUMNS)) as sink:
+        for row in rows:
+            sink.write(row)
+
+    return sink.count, sink.sink.count
+
+
+# =============================
+# CLI
+# =============================
+
+def read_rows(path: Path) -> Iterable[dict]:
+    import pandas as pd
+
+    suffix = path.suffix.lower()
+    if suffix in (".xlsx", ".xlsm"):
+        df = pd.read_excel(path, dtype=str)
+    elif suffix == ".csv":
+        df = pd.read_csv(path, dtype=str)
+    elif suffix == ".jsonl":
+        df = pd.read_json(path, lines=True, dtype=False)
+    elif suffix == ".parquet":
+        df = pd.read_parquet(path)
+    else:
+        raise ValueError(f"Unsupported input format: {suffix}")
+
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict("records")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge duplicate organizations in scraper output")
+    parser.add_argument("input", help="Scraper output (xlsx, csv, jsonl or parquet)")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--format", choices=FORMATS, default=None,
+                        help="Output format (default: from the output file name)")
+    args = parser.parse_args()
+
+    output = Path(args.output)
+    fmt = args.format or output.suffix.lstrip(".").lower()
+
+    rows_in, rows_out = write_deduplicated(read_rows(Path(args.input)), output, fmt)
+    print(f"{rows_in} rows → {rows_out} organizations → {output}")
+
+
+if __name__ == "__main__":
+    main()
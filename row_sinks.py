@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+"""
+Streaming Row Sinks
+
+Writers that append scraped rows to disk as they arrive,
+so memory stays flat however long the job runs.
+
+Formats:
+- csv     fastest, opens in Excel
+- jsonl   one JSON object per line
+- parquet compact columnar storage (requires pyarrow)
+- xlsx    constant-memory write-only workbook (requires openpyxl)
+"""
+
+import csv
+import json
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List
+
+
+# Rows buffered per Parquet row group
+PARQUET_BATCH = 1000
+
+FORMATS = ("xlsx", "csv", "jsonl", "parquet")
+
+
+class RowSink(ABC):
+    """
+    Base sink: thread-safe write(), row counting
+    and context-manager support.
+    """
+
+    def __init__(self, path: Path | None, columns: List[str]):
+        # None for sinks that don't write a file
+        self.path = Path(path) if path is not None else None
+        self.columns = columns
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, row: dict):
+        with self._lock:
+            self._write(row)
+            self.count += 1
+
+    @abstractmethod
+    def _write(self, row: dict):
+        ...
+
+    def close(self):
+        pass
+
+
+class CsvSink(RowSink):
+
+    def __init__(self, path: Path, columns: List[str]):
+        super().__init__(path, columns)
+        # BOM so Excel detects UTF-8
+        self._file = open(self.path, "w", newline="", encoding="utf-8-sig")
+        self._writer = csv.DictWriter(self._file, fieldnames=columns, extrasaction="ignore")
+        self._writer.writeheader()
+
+    def _write(self, row: dict):
+        self._writer.writerow(row)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class JsonlSink(RowSink):
+
+    def __init__(self, path: Path, columns: List[str]):
+        super().__init__(path, columns)
+        self._file = open(self.path, "w", encoding="utf-8")
+
+    def _write(self, row: dict):
+        self._file.write(json.dumps({c: row.get(c) for c in self.columns}, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink(RowSink):
+
+    def __init__(self, path: Path, columns: List[str]):
+        super().__init__(path, columns)
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema([(c, pa.string()) for c in columns])
+        self._writer = pq.ParquetWriter(str(self.path), self._schema)
+        self._buffer = []
+
+    def _write(self, row: dict):
+        self._buffer.append(row)
+        if len(self._buffer) >= PARQUET_BATCH:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        data = {
+            c: [None if row.get(c) is None else str(row.get(c)) for row in self._buffer]
+            for c in self.columns
+        }
+        self._writer.write_table(self._pa.table(data, schema=self._schema))
+        self._buffer = []
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._writer.close()
+
+
+class XlsxSink(RowSink):
+
+    def __init__(self, path: Path, columns: List[str]):
+        super().__init__(path, columns)
+
+        from openpyxl import Workbook
+
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet()
+        self._sheet.append(columns)
+
+    def _write(self, row: dict):
+        self._sheet.append([row.get(c) for c in self.columns])
+
+    def close(self):
+        with self._lock:
+            self._workbook.save(self.path)
+
+
+SINKS = {
+    "xlsx": XlsxSink,
+    "csv": CsvSink,
+    "jsonl": JsonlSink,
+    "parquet": ParquetSink,
+}
+
+
+def open_sink(path: Path, fmt: str, columns: List[str]) -> RowSink:
+    """
+    Creates a sink for the given format.
+    """
+    if fmt not in SINKS:
+        raise ValueError(f"Unknown output format: {fmt} (expected one of {', '.join(FORMATS)})")
+    return SINKS[fmt](path, columns)
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+"""
+Scrape Checkpoint Store
+
+SQLite store used by yandex_maps_parsing to survive crashes
+and blocks. Every (category, city) job's collected links and
+every parsed card are written as soon as they are ready.
+
+The cards table doubles as a cross-run dedup index:
+an organization URL that was visited once is never visited again.
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    categories TEXT NOT NULL,
+    cities TEXT NOT NULL,
+    filter_address INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    run_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    city TEXT NOT NULL,
+    links TEXT NOT NULL,
+    PRIMARY KEY (run_id, category, city)
+);
+
+CREATE TABLE IF NOT EXISTS cards (
+    url TEXT PRIMARY KEY,
+    run_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    city TEXT NOT NULL,
+    row TEXT,
+    scraped_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS cards_run ON cards (run_id);
+"""
+
+
+class ScrapeStore:
+    """
+    Thread-safe checkpoint store.
+
+    A job is finished once its links are recorded and every
+    link is present in the cards table. Cards skipped by the
+    city filter are stored with an empty row.
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    # ---------- runs ----------
+
+    def start_run(self, categories: List[str], cities: List[str], filter_address: bool) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (started_at, categories, cities, filter_address) VALUES (?, ?, ?, ?)",
+                (
+                    datetime.now().isoformat(timespec="seconds"),
+                    json.dumps(categories, ensure_ascii=False),
+                    json.dumps(cities, ensure_ascii=False),
+                    int(filter_address),
+                ),
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def last_run(self) -> Tuple[int, List[str], List[str], bool] | None:
+        """
+        Returns (run_id, categories, cities, filter_address)
+        of the most recent run.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, categories, cities, filter_address FROM runs ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        run_id, categories, cities, filter_address = row
+        return run_id, json.loads(categories), json.loads(cities), bool(filter_address)
+
+    # ---------- jobs ----------
+
+    def job_links(self, run_id: int, category: str, city: str) -> List[str] | None:
+        """
+        Returns links recorded for the job, or None if the
+        search has not completed yet.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT links FROM jobs WHERE run_id = ? AND category = ? AND city = ?",
+                (run_id, category, city),
+            ).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    def save_links(self, run_id: int, category: str, city: str, links: List[str]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (run_id, category, city, links) VALUES (?, ?, ?, ?)",
+                (run_id, category, city, json.dumps(links)),
+            )
+            self._conn.commit()
+
+    # ---------- cards ----------
+
+    def unseen(self, urls: Iterable[str]) -> List[str]:
+        """
+        Filters out URLs visited in this or any previous run.
+        """
+        urls = list(urls)
+
+        with self._lock:
+            seen = set()
+            for i in range(0, len(urls), 500):
+                chunk = urls[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                seen.update(
+                    url for (url,) in self._conn.execute(
+                        f"SELECT url FROM cards WHERE url IN ({placeholders})", chunk
+                    )
+                )
+
+        return [url for url in urls if url not in seen]
+
+    def repeat_rows(self, run_id: int, urls: Iterable[str], category: str, city: str) -> List[dict]:
+        """
+        Rows of URLs already parsed in this run under another
+        category or city: the same organization was found again,
+        and the caller may merge the new category in.
+        """
+        urls = list(urls)
+        rows = []
+
+        with self._lock:
+            for i in range(0, len(urls), 500):
+                chunk = urls[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(
+                    json.loads(row) for (row,) in self._conn.execute(
+                        f"SELECT row FROM cards WHERE run_id = ? AND row IS NOT NULL "
+                        f"AND NOT (category = ? AND city = ?) AND url IN ({placeholders})",
+                        (run_id, category, city, *chunk),
+                    )
+                )
+
+        return rows
+
+    def save_card(self, run_id: int, url: str, category: str, city: str, row: dict | None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cards (url, run_id, category, city, row, scraped_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    run_id,
+                    category,
+                    city,
+                    json.dumps(row, ensure_ascii=False) if row is not None else None,
+                    datetime.now().isoformat(timespec="seconds"),
+                ),
+            )
+            self._conn.commit()
+
+    def iter_run_rows(self, run_id: int, batch: int = 1000) -> Iterator[dict]:
+        """
+        Yields parsed rows of a run in the order they were saved,
+        reading them in batches.
+        """
+        last = 0
+
+        while True:
+            with self._lock:
+                page = self._conn.execute(
+                    "SELECT rowid, row FROM cards WHERE run_id = ? AND row IS NOT NULL AND rowid > ? "
+                    "ORDER BY rowid LIMIT ?",
+                    (run_id, last, batch),
+                ).fetchall()
+
+            if not page:
+                return
+
+            for last, row in page:
+                yield json.loads(row)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
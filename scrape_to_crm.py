@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+"""
+Scraper → amoCRM Pipeline
+
+Runs yandex_maps_parsing and excel_import as one streaming job:
+parsed cards go through a bounded in-memory queue straight into
+batched company creation while scraping is still running,
+with no intermediate Excel file.
+
+Features:
+- Backpressure: when the CRM rate limit slows uploads, the queue
+  fills up and scraper workers block until there is room
+- Shared column schema (crm_schema), no manual column renaming
+- Same dedup index, batching and checkpoint store as the
+  standalone scripts
+- Optional merge of cards of one organization (other category
+  or neighbouring city) into a single company (--dedup); merged
+  companies are uploaded once scraping has finished
+"""
+
+import argparse
+import queue
+import threading
+import time
+from typing import Iterator, List
+
+import pandas as pd
+
+from crm_schema import SCRAPED_COLUMNS, to_import_columns
+from excel_import import BATCH_SIZE, UPDATE_EXISTING, upload_companies
+from row_dedup import MergingSink
+from row_sinks import RowSink
+from scrape_store import ScrapeStore
+from yandex_maps_parsing import STORE_PATH, WORKERS, run_worker_pool
+
+
+# =============================
+# CONFIGURATION
+# =============================
+
+# Parsed cards held between the scraper and the uploader
+QUEUE_SIZE = 500
+
+# Seconds a partial batch waits for more cards before it is sent
+FLUSH_INTERVAL = 10
+
+
+# =============================
+# QUEUE SINK
+# =============================
+
+_DONE = object()
+
+
+class QueueSink(RowSink):
+    """
+    Row sink that hands rows to the uploader.
+    write() blocks while the queue is full.
+    """
+
+    def __init__(self, maxsize: int = QUEUE_SIZE, columns: List[str] = SCRAPED_COLUMNS):
+        super().__init__(None, columns)
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def _write(self, row: dict):
+        self.queue.put({c: row.get(c) for c in self.columns})
+
+    def close(self):
+        self.queue.put(_DONE)
+
+    def chunks(self, size: int = BATCH_SIZE, interval: float = FLUSH_INTERVAL) -> Iterator[pd.DataFrame]:
+        """
+        Drains the queue into DataFrames with import columns.
+        A chunk is yielded once it holds size rows, when no row
+        arrived for interval seconds, or when the sink is closed.
+        Indexes keep growing across chunks.
+        """
+        rows = []
+        start = 0
+
+        def flush():
+            nonlocal rows, start
+            df = pd.DataFrame(rows, columns=self.columns, index=range(start, start + len(rows)))
+            start += len(rows)
+            rows = []
+            return to_import_columns(df)
+
+        while True:
+            try:
+                row = self.queue.get(timeout=interval)
+            except queue.Empty:
+                if rows:
+                    yield flush()
+                continue
+
+            if row is _DONE:
+                break
+
+            rows.append(row)
+            if len(rows) >= size:
+                yield flush()
+
+        if rows:
+            yield flush()
+
+
+# =============================
+# PIPELINE
+# =============================
+
+def run_pipeline(categories: List[str], cities: List[str], filter_address: bool,
+                 workers: int = WORKERS, headless: bool = True, use_http: bool = False,
+                 queue_size: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE,
+                 update_existing: bool = UPDATE_EXISTING, store_path: str = STORE_PATH,
+                 dedup: bool = False):
+    """
+    Scrapes in a background thread and uploads
+    companies in the calling thread as cards arrive.
+    With dedup, cards are merged per organization and
+    the merged companies are queued when scraping ends.
+    """
+    store = ScrapeStore(store_path)
+    run_id = store.start_run(categories, cities, filter_address)
+    sink = QueueSink(queue_size)
+    cards = MergingSink(sink) if dedup else sink
+
+    def scrape():
+        try:
+            run_worker_pool(categories, cities, filter_address, cards, workers,
+                            headless=headless, use_http=use_http, store=store, run_id=run_id)
+        except Exception as e:
+            print(f"❌ Scraper stopped: {e}")
+        finally:
+            cards.close()
+
+    started = time.monotonic()
+    scraper = threading.Thread(target=scrape, name="scraper", daemon=True)
+    scraper.start()
+
+    try:
+        upload_companies(sink.chunks(batch_size), batch_size=batch_size,
+                         update_existing=update_existing)
+        scraper.join()
+    finally:
+        store.close()
+
+    print(f"Scraped {cards.count} cards in {time.monotonic() - started:.0f}s")
+    if cards is not sink:
+        print(f"Merged into {sink.count} organizations")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape map listings straight into amoCRM")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Number of parallel browser sessions")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run browsers in headless mode (always on with several workers)")
+    parser.add_argument("--fetcher", choices=("browser", "http"), default="browser",
+                        help="Card page backend; http falls back to the browser per page")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                        help="Parsed cards buffered before scraping pauses")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="Companies sent per bulk request")
+    parser.add_argument("--update-existing", action="store_true",
+                        help="Update companies already in CRM instead of skipping them")
+    parser.add_argument("--store", default=str(STORE_PATH),
+                        help="Checkpoint / seen-URL database")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Merge cards of one organization before upload "
+                             "(uploads start when scraping ends)")
+    args = parser.parse_args()
+
+    raw_categories = input("Enter categories separated by comma: ").strip()
+    categories = [c.strip() for c in raw_categories.split(",") if c.strip()]
+
+    raw_cities = input("Enter cities separated by comma: ").strip()
+    cities = [c.strip() for c in raw_cities.split(",") if c.strip()]
+
+    filter_input = input("Enable city-based filtering? (Yes/No): ").strip().lower()
+    filter_address = filter_input.startswith("y")
+
+    run_pipeline(
+        categories, cities, filter_address,
+        workers=args.workers,
+        headless=args.headless or args.workers > 1,
+        use_http=args.fetcher == "http",
+        queue_size=args.queue_size,
+        batch_size=args.batch_size,
+        update_existing=args.update_existing,
+        store_path=args.store,
+        dedup=args.dedup,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -5,22 +5,34 @@ CRM Lead Scraper
 
 This script collects business listings from a map-based web platform,
 parses structured data (name, address, phone, website, working hours),
-and exports the results to an Excel file.
+and streams the results to an Excel, CSV, JSONL or Parquet file.
 
 Features:
 - Dynamic scrolling
-- Anti-blocking delays
+- Anti-blocking delays with readiness-driven page waits
+- Parallel scraping with a pool of browser sessions
+- Optional HTTP-only card fetching with browser fallback
+- Checkpointed, resumable runs with cross-run URL dedup
+- Optional raw page archive for offline re-parsing (reparse.py)
+- Optional merge of duplicate organizations (row_dedup.py)
 - Address filtering by city
 - Working hours normalization
 - Automatic file naming with transliteration
+- Cached, pinnable chromedriver resolution
 """
 
+import os
+import json
 import time
 import random
+import argparse
+import threading
 import urllib.parse
+from itertools import count
 from pathlib import Path
+from queue import PriorityQueue
 from datetime import datetime
-from typing import List
+from typing import Callable, Iterator, List, Tuple
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -29,28 +41,79 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
+from selenium.common.exceptions import SessionNotCreatedException, TimeoutException
 
 from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
-import pandas as pd
-import re
+
+from card_extract import extract_row, has_card_markup, parse_html
+from card_fetch import HttpCardFetcher
+from crm_schema import SCRAPED_COLUMNS
+from page_archive import PageArchive
+from row_dedup import MergingSink
+from row_sinks import FORMATS, RowSink, open_sink
+from scrape_store import ScrapeStore
 
 
 # =============================
 # CONFIGURATION
 # =============================
 
-# Delay between scroll actions
+# Delay between scroll actions (adapted between min and max)
 SCROLL_PAUSE = 1.2
+SCROLL_PAUSE_MIN = 0.4
+SCROLL_PAUSE_MAX = 3.0
+
+# Pixels scrolled per step in the results list (adapted between min and max)
+SCROLL_STEP = 800
+SCROLL_STEP_MIN = 400
+SCROLL_STEP_MAX = 1600
 
 # Maximum consecutive scroll attempts without new results
 MAX_SCROLL_ERRORS = 5
 
+# Results list selectors
+LINK_SELECTOR = "a.link-overlay[href*='/org/']"
+LIST_CONTAINER_SELECTOR = ".scroll__container"
+LIST_END_SELECTOR = ".add-business-view"
+
+# Maximum wait for a page to render its key elements
+RENDER_TIMEOUT = 10
+
+# Extra wait for the address block once the title is present
+ADDRESS_TIMEOUT = 2
+
+# Anti-blocking politeness: minimum time between page loads
+# (base + random jitter), render time counts towards it
+SEARCH_DELAY = 2
+SEARCH_JITTER = 1
+CARD_DELAY = 1
+CARD_JITTER = 0.5
+
+# Parallel browser sessions (1 = single visible browser)
+WORKERS = 1
+
 # Output directory for Excel files
 OUTPUT_DIR = Path("yandex_result")
 OUTPUT_DIR.mkdir(exist_ok=True)
 
+# Checkpoints and cross-run index of visited organizations
+STORE_PATH = OUTPUT_DIR / "scrape_state.sqlite3"
+
+# Default location of the raw page archive (--archive)
+ARCHIVE_DIR = OUTPUT_DIR / "pages"
+
+# Output columns, in file order (shared with excel_import via crm_schema)
+COLUMNS = SCRAPED_COLUMNS
+
+# Pinned chromedriver: an explicit binary skips resolution,
+# a version skips webdriver_manager's latest-release lookup
+CHROMEDRIVER_PATH = os.getenv("CHROMEDRIVER_PATH")
+CHROMEDRIVER_VERSION = os.getenv("CHROMEDRIVER_VERSION")
+
+# Resolved driver binary, reused by later runs for DRIVER_CACHE_TTL seconds
+DRIVER_CACHE_PATH = OUTPUT_DIR / "chromedriver.json"
+DRIVER_CACHE_TTL = 7 * 24 * 3600
+
 
 # =============================
 # TRANSLITERATION
@@ -98,25 +161,183 @@ def create_driver(headless=False) -> webdriver.Chrome:
     options.add_argument("--start-maximized")
     options.add_argument("--disable-blink-features=AutomationControlled")
 
-    service = Service(ChromeDriverManager().install())
+    try:
+        return webdriver.Chrome(service=Service(chromedriver_path()), options=options)
+    except SessionNotCreatedException:
+        if CHROMEDRIVER_PATH:
+            raise
+        # Chrome updated since the driver was cached
+        print("↻ Cached chromedriver rejected, resolving again")
+        return webdriver.Chrome(service=Service(chromedriver_path(refresh=True)), options=options)
+
+
+_driver_path: str | None = None
+_driver_path_lock = threading.Lock()
+
+
+def _cached_driver_path() -> str | None:
+    try:
+        cached = json.loads(DRIVER_CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        return None
+
+    fresh = time.time() - cached.get("resolved_at", 0) < DRIVER_CACHE_TTL
+    pinned = cached.get("version") == CHROMEDRIVER_VERSION
+    if fresh and pinned and Path(cached.get("path", "")).exists():
+        return cached["path"]
+    return None
+
+
+def chromedriver_path(refresh: bool = False) -> str:
+    """
+    Resolves the chromedriver binary once per process and
+    caches it on disk, so most runs (and every worker after
+    the first) skip the version lookup and download check.
+    """
+    global _driver_path
+
+    if CHROMEDRIVER_PATH:
+        return CHROMEDRIVER_PATH
+
+    with _driver_path_lock:
+        if refresh:
+            _driver_path = None
+        else:
+            _driver_path = _driver_path or _cached_driver_path()
+
+        if _driver_path is None:
+            _driver_path = ChromeDriverManager(driver_version=CHROMEDRIVER_VERSION).install()
+            DRIVER_CACHE_PATH.write_text(json.dumps({
+                "path": _driver_path,
+                "version": CHROMEDRIVER_VERSION,
+                "resolved_at": time.time(),
+            }))
+
+        return _driver_path
+
+
+# =============================
+# PAGE WAITS AND TIMINGS
+# =============================
+
+class PageTimings:
+    """
+    Collects per-page render wait and politeness delay
+    so both can be tuned.
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, render: float, delay: float):
+        with self._lock:
+            stats = self._stats.setdefault(kind, {"pages": 0, "render": 0.0, "max_render": 0.0, "delay": 0.0})
+            stats["pages"] += 1
+            stats["render"] += render
+            stats["max_render"] = max(stats["max_render"], render)
+            stats["delay"] += delay
+
+    def summary(self) -> List[str]:
+        with self._lock:
+            return [
+                f"{kind}: {st['pages']} pages, render avg {st['render'] / st['pages']:.2f}s "
+                f"(max {st['max_render']:.2f}s), delay avg {st['delay'] / st['pages']:.2f}s"
+                for kind, st in self._stats.items()
+            ]
+
+
+page_timings = PageTimings()
+
+# Raw pages are saved here when --archive is given
+page_archive: PageArchive | None = None
+
+
+def wait_for(driver, css: str, timeout: float) -> bool:
+    """
+    Waits until an element matching the selector is present.
+    """
+    try:
+        WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, css))
+        )
+        return True
+    except TimeoutException:
+        return False
+
+
+def polite_pause(kind: str, started: float, base: float, jitter: float):
+    """
+    Sleeps for whatever is left of the politeness delay
+    after rendering and records the page timings.
+    """
+    render = time.monotonic() - started
+    delay = max(0.0, base + random.uniform(0, jitter) - render)
+
+    time.sleep(delay)
+    page_timings.record(kind, render, delay)
 
-    return webdriver.Chrome(service=service, options=options)
+    print(f"⏱ {kind}: render {render:.2f}s, delay {delay:.2f}s")
 
 
 # =============================
 # SCROLL AND LINK COLLECTION
 # =============================
 
+# Runs in the page on every scroll step: returns only hrefs not
+# returned before (tracked in a Set on window), scrolls the results
+# container and reports whether the end-of-list marker is shown.
+HARVEST_SCRIPT = """
+const [step, reset, linkSelector, containerSelector, endSelector] = arguments;
+if (reset || !window.__orgLinksSeen) {
+    window.__orgLinksSeen = new Set();
+}
+const seen = window.__orgLinksSeen;
+const fresh = [];
+for (const a of document.querySelectorAll(linkSelector)) {
+    const href = (a.href || "").split("?")[0];
+    if (href && !seen.has(href)) {
+        seen.add(href);
+        fresh.push(href);
+    }
+}
+const container = document.querySelector(containerSelector);
+if (container && step) {
+    container.scrollTop += step;
+}
+return [fresh, document.querySelector(endSelector) !== null, container !== null];
+"""
+
+
+def harvest(driver, step: int, reset: bool = False):
+    """
+    One WebDriver round trip: new links, end-of-list flag,
+    and whether the container was scrolled.
+    """
+    return driver.execute_script(
+        HARVEST_SCRIPT, step, reset, LINK_SELECTOR, LIST_CONTAINER_SELECTOR, LIST_END_SELECTOR
+    )
+
+
 def collect_links(driver: webdriver.Chrome) -> List[str]:
     """
     Scrolls through the results panel and collects
     unique organization links.
 
+    Each scroll is a single execute_script call that returns
+    only new links. Step and pause adapt to how fast new
+    results arrive: longer steps and shorter pauses while
+    every scroll brings new cards, shorter steps and longer
+    pauses while the list is still loading. Scrolling stops
+    at the end-of-list marker.
+
     Returns:
         List[str]: List of unique business URLs
     """
-    links = set()
+    links = []
     errors = 0
+    pause = SCROLL_PAUSE
+    step = SCROLL_STEP
 
     # Wait for the scrollable panel to appear
     try:
@@ -128,142 +349,278 @@ def collect_links(driver: webdriver.Chrome) -> List[str]:
         return []
 
     actions = ActionChains(driver)
+    reset = True
 
-    # Scroll until no new links are found
+    # Scroll until the list ends or no new links are found
     while errors < MAX_SCROLL_ERRORS:
-        cards = driver.find_elements(By.CSS_SELECTOR, "a.link-overlay[href*='/org/']")
-        new = 0
-
-        for c in cards:
+        new, at_end, scrolled = harvest(driver, step, reset)
+        reset = False
+        links.extend(new)
+
+        if at_end:
+            # Pick up cards revealed by the last scroll
+            links.extend(harvest(driver, 0)[0])
+            break
+
+        if new:
+            errors = 0
+            pause = max(SCROLL_PAUSE_MIN, pause * 0.7)
+            step = min(SCROLL_STEP_MAX, int(step * 1.5))
+        else:
+            errors += 1
+            pause = min(SCROLL_PAUSE_MAX, pause * 1.5)
+            step = max(SCROLL_STEP_MIN, step // 2)
+
+        # Fall back to dragging the scrollbar
+        if not scrolled:
             try:
-                href = c.get_attribute("href")
-            except StaleElementReferenceException:
-                continue
+                actions.click_and_hold(slider).move_by_offset(0, 160).release().perform()
+            except Exception:
+                pass
+
+        time.sleep(pause + random.uniform(0, 0.2))
+
+    return links
 
-            if not href:
-                continue
 
-            clean = href.split("?")[0]
+# =============================
+# CARD PARSING
+# =============================
 
-            if clean not in links:
-                links.add(clean)
-                new += 1
+def load_card(driver, url: str, html: str | None = None) -> Tuple[object, str]:
+    """
+    Returns the parsed organization page and its HTML.
+    Uses pre-fetched HTML when it contains the card,
+    otherwise opens the page in the browser.
+    """
+    if html is not None:
+        doc = parse_html(html)
+        if has_card_markup(doc):
+            return doc, html
+        print(f"↺ Browser fallback: {url}")
 
-        errors = errors + 1 if new == 0 else 0
+    started = time.monotonic()
+    driver.get(url)
 
-        try:
-            actions.click_and_hold(slider).move_by_offset(0, 160).release().perform()
-        except Exception:
-            pass
+    if wait_for(driver, "h1", RENDER_TIMEOUT):
+        wait_for(driver, "div.business-contacts-view__address", ADDRESS_TIMEOUT)
 
-        time.sleep(SCROLL_PAUSE + random.uniform(0, 0.4))
+    polite_pause("card", started, CARD_DELAY, CARD_JITTER)
 
-    return list(links)
+    html = driver.page_source
+    return parse_html(html), html
 
 
-# =============================
-# ADDRESS FILTERING
-# =============================
+def parse_card(driver, url: str, city: str, category: str, filter_address: bool,
+               html: str | None = None) -> dict | None:
+    """
+    Loads a single organization page and extracts business data.
+    The raw page goes to the archive when one is enabled.
+    """
+    doc, html = load_card(driver, url, html)
 
-def address_matches(address: str, city: str) -> bool:
+    if page_archive is not None:
+        page_archive.save(url, html, category=category, city=city)
+
+    return extract_row(doc, url, city, category, filter_address)
+
+
+def parse_cards(driver, links, city: str, category: str, filter_address: bool,
+                fetcher: HttpCardFetcher | None = None,
+                on_card: Callable[[str, dict | None], None] | None = None) -> Iterator[dict]:
     """
-    Checks whether the city name is present in the address.
+    Visits each collected URL and yields business data
+    as soon as each page is parsed.
+    With a fetcher, pages are pulled over HTTP first.
+    on_card is called with (url, row or None) after every page.
     """
-    return re.search(rf"\b{re.escape(city.lower())}\b", address.lower()) is not None
+    if fetcher:
+        pages = fetcher.fetch_many(links)
+    else:
+        pages = ((url, None) for url in links)
+
+    for i, (url, html) in enumerate(pages, 1):
+        print(f"[{i}/{len(links)}] {url}")
+
+        row = parse_card(driver, url, city, category, filter_address, html)
+        if on_card:
+            on_card(url, row)
+        if row:
+            yield row
 
 
 # =============================
-# WORKING HOURS PARSING
+# SEARCH
 # =============================
 
-def parse_working_hours(soup: BeautifulSoup):
+def search_links(driver, category: str, city: str) -> List[str]:
     """
-    Extracts and normalizes working hours from the page.
+    Opens the search results for a category in a city
+    and collects organization links.
     """
-    status = soup.select_one("div.business-working-status-view")
+    print("===================================")
+    print(f"City: {city} | Category: {category}")
 
-    # Check for 24/7 operation
-    if status and "круглосуточ" in status.get_text(strip=True).lower():
-        return "24/7"
+    query = f"{category} {city}"
+    url = f"https://yandex.ru/maps/?text={urllib.parse.quote(query)}"
 
-    metas = soup.select("meta[itemprop='openingHours']")
-    if not metas:
-        return None
+    started = time.monotonic()
+    driver.get(url)
 
-    entries = [m.get("content") for m in metas if m.get("content")]
-    return normalize_hours(entries)
+    wait_for(driver, LINK_SELECTOR, RENDER_TIMEOUT)
+    polite_pause("search", started, SEARCH_DELAY, SEARCH_JITTER)
 
+    links = collect_links(driver)
+    print(f"Collected links: {len(links)}")
 
-def normalize_hours(entries: List[str]) -> str | None:
+    if not links:
+        print("No results found")
+
+    return links
+
+
+def pending_links(driver, category: str, city: str,
+                  store: ScrapeStore | None = None, run_id: int | None = None,
+                  on_repeat: Callable[[dict], None] | None = None) -> List[str]:
     """
-    Converts structured opening hours into a readable format.
+    Returns links of a job that still have to be visited.
+    With a store, links of a resumed job are reused and
+    organizations seen in any run are skipped. Rows of
+    skipped links parsed earlier in this run under another
+    category or city are passed to on_repeat with this
+    job's category, so a merging sink lists both.
     """
-    day_map = {
-        "Mo": "Mon", "Tu": "Tue", "We": "Wed",
-        "Th": "Thu", "Fr": "Fri", "Sa": "Sat", "Su": "Sun"
-    }
+    if store is None:
+        return search_links(driver, category, city)
 
-    parsed = []
+    links = store.job_links(run_id, category, city)
 
-    for e in entries:
-        parts = e.split()
-        if len(parts) == 2:
-            day, hours = parts
-            parsed.append((day_map.get(day, day), hours))
+    if links is None:
+        links = search_links(driver, category, city)
+        store.save_links(run_id, category, city, links)
+    else:
+        print("===================================")
+        print(f"City: {city} | Category: {category} (resumed, {len(links)} links)")
 
-    if not parsed:
-        return None
+    pending = store.unseen(links)
+    if len(pending) < len(links):
+        print(f"Already seen: {len(links) - len(pending)}, new: {len(pending)}")
+
+        if on_repeat is not None:
+            pending_set = set(pending)
+            skipped = [link for link in links if link not in pending_set]
+            for row in store.repeat_rows(run_id, skipped, category, city):
+                on_repeat({**row, "Category": category})
 
-    hours_set = {h for _, h in parsed}
+    return pending
 
-    if len(hours_set) == 1:
-        return f"{parsed[0][0]}–{parsed[-1][0]} {parsed[0][1]}"
 
-    return "; ".join(f"{d} {h}" for d, h in parsed)
+def repeats_to(sink: RowSink) -> Callable[[dict], None] | None:
+    """
+    Repeat hits only matter to a merging sink; other
+    sinks keep one row per visited card.
+    """
+    return sink.write if isinstance(sink, MergingSink) else None
 
 
 # =============================
-# CARD PARSING
+# WORKER POOL
 # =============================
 
-def parse_cards(driver, links, city: str, category: str, filter_address: bool) -> List[dict]:
+# Queue priorities: finish cards of a search before starting the next one
+CARD_JOB = 0
+SEARCH_JOB = 1
+
+
+def scrape_worker(jobs: PriorityQueue, counter: count, sink: RowSink,
+                  filter_address: bool, headless: bool, use_http: bool = False,
+                  store: ScrapeStore | None = None, run_id: int | None = None):
     """
-    Visits each collected URL and extracts business data.
+    Runs one driver session and processes jobs until a
+    stop marker (None) is received. Rows go straight to the sink.
     """
-    rows = []
+    try:
+        driver = create_driver(headless=headless)
+    except Exception as e:
+        print(f"❌ Driver start failed: {e}")
+        return
 
-    for i, url in enumerate(links, 1):
-        print(f"[{i}/{len(links)}] {url}")
+    fetcher = HttpCardFetcher(driver, concurrency=1) if use_http else None
+
+    try:
+        while True:
+            _, _, job = jobs.get()
 
-        driver.get(url)
-        time.sleep(2)
+            if job is None:
+                jobs.task_done()
+                return
 
-        soup = BeautifulSoup(driver.page_source, "lxml")
+            try:
+                kind, category, city, url = job
+
+                if kind == SEARCH_JOB:
+                    for link in pending_links(driver, category, city, store, run_id, repeats_to(sink)):
+                        jobs.put((CARD_JOB, next(counter), (CARD_JOB, category, city, link)))
+                    if fetcher:
+                        fetcher.sync_from_driver(driver)
+                else:
+                    print(f"[{threading.current_thread().name}] {url}")
+                    html = fetcher.fetch(url) if fetcher else None
+                    row = parse_card(driver, url, city, category, filter_address, html)
+                    if store:
+                        store.save_card(run_id, url, category, city, row)
+                    if row:
+                        sink.write(row)
 
-        name_el = soup.select_one("h1")
-        addr_el = soup.select_one("div.business-contacts-view__address a")
-        phone_el = soup.select_one("div.orgpage-phones-view__phone-number")
-        site_el = soup.select_one("a.business-urls-view__link")
+            except Exception as e:
+                print(f"Job error {job}: {e}")
 
-        address_text = addr_el.get_text(strip=True) if addr_el else None
+            finally:
+                jobs.task_done()
 
-        # Optional city-based filtering
-        if filter_address and address_text and not address_matches(address_text, city):
-            print(f"⛔ Skipped (outside city): {address_text}")
-            continue
+    finally:
+        if fetcher:
+            fetcher.close()
+        driver.quit()
 
-        rows.append({
-            "Category": category,
-            "City": city,
-            "Name": name_el.get_text(strip=True) if name_el else None,
-            "Address": address_text,
-            "Phone": phone_el.get_text(strip=True) if phone_el else None,
-            "Website": site_el.get_text(strip=True) if site_el else None,
-            "Working Hours": parse_working_hours(soup),
-            "URL": url
-        })
 
-    return rows
+def run_worker_pool(categories: List[str], cities: List[str], filter_address: bool, sink: RowSink,
+                    workers: int, headless: bool = True, use_http: bool = False,
+                    store: ScrapeStore | None = None, run_id: int | None = None):
+    """
+    Scrapes every (category, city) pair with a pool of
+    driver sessions pulling jobs from a shared queue.
+    """
+    jobs = PriorityQueue()
+    counter = count()
+
+    for category in categories:
+        for city in cities:
+            jobs.put((SEARCH_JOB, next(counter), (SEARCH_JOB, category, city, None)))
+
+    threads = [
+        threading.Thread(
+            target=scrape_worker,
+            args=(jobs, counter, sink, filter_address, headless, use_http, store, run_id),
+            name=f"worker-{i + 1}",
+            daemon=True,
+        )
+        for i in range(max(workers, 1))
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    # Wait for the queue to drain (or for every worker to die)
+    while jobs.unfinished_tasks and any(thread.is_alive() for thread in threads):
+        time.sleep(0.5)
+
+    # Stop the remaining workers
+    for _ in threads:
+        jobs.put((float("inf"), next(counter), None))
+
+    for thread in threads:
+        thread.join()
 
 
 # =============================
@@ -276,64 +633,118 @@ def main():
     - Collect user input
     - Iterate over categories and cities
     - Scrape data
-    - Export results to Excel
+    - Stream results to the output file
     """
 
-    raw_categories = input("Enter categories separated by comma: ").strip()
-    categories = [c.strip() for c in raw_categories.split(",") if c.strip()]
+    parser = argparse.ArgumentParser(description="Map listings scraper")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Number of parallel browser sessions")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run browsers in headless mode (always on with several workers)")
+    parser.add_argument("--fetcher", choices=("browser", "http"), default="browser",
+                        help="Card page backend; http falls back to the browser per page")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the last run, skipping finished jobs and visited pages")
+    parser.add_argument("--store", default=str(STORE_PATH),
+                        help="Checkpoint / seen-URL database")
+    parser.add_argument("--format", choices=FORMATS, default="xlsx",
+                        help="Output format (csv/jsonl are fastest, xlsx for the sales team)")
+    parser.add_argument("--archive", nargs="?", const=str(ARCHIVE_DIR), default=None,
+                        help=f"Save raw card pages for reparse.py (default dir: {ARCHIVE_DIR})")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Write one merged record per organization (written when the run ends)")
+    args = parser.parse_args()
+    use_http = args.fetcher == "http"
+
+    global page_archive
+    if args.archive:
+        page_archive = PageArchive(args.archive)
+
+    store = ScrapeStore(args.store)
+    last_run = store.last_run() if args.resume else None
+
+    if last_run:
+        run_id, categories, cities, filter_address = last_run
+        print(f"Resuming run {run_id}: {', '.join(categories)} / {', '.join(cities)}")
+    else:
+        if args.resume:
+            print("No run to resume, starting a new one")
+
+        raw_categories = input("Enter categories separated by comma: ").strip()
+        categories = [c.strip() for c in raw_categories.split(",") if c.strip()]
 
-    raw_cities = input("Enter cities separated by comma: ").strip()
-    cities = [c.strip() for c in raw_cities.split(",") if c.strip()]
+        raw_cities = input("Enter cities separated by comma: ").strip()
+        cities = [c.strip() for c in raw_cities.split(",") if c.strip()]
 
-    filter_input = input("Enable city-based filtering? (Yes/No): ").strip().lower()
-    filter_address = filter_input.startswith("y")
+        filter_input = input("Enable city-based filtering? (Yes/No): ").strip().lower()
+        filter_address = filter_input.startswith("y")
 
-    all_rows = []
+        run_id = store.start_run(categories, cities, filter_address)
 
-    driver = create_driver(headless=False)
+    date = datetime.now().strftime("%d.%m.%Y")
 
-    try:
-        for category in categories:
-            for city in cities:
+    # Dynamic file naming
+    if len(cities) == 1:
+        filename = f"{transliterate(cities[0])}_{date}.{args.format}"
+    else:
+        filename = f"map_results_{date}.{args.format}"
 
-                print("===================================")
-                print(f"City: {city} | Category: {category}")
+    out = OUTPUT_DIR / filename
+    sink = open_sink(out, args.format, COLUMNS)
+    if args.dedup:
+        sink = MergingSink(sink)
 
-                query = f"{category} {city}"
-                url = f"https://yandex.ru/maps/?text={urllib.parse.quote(query)}"
+    # Rows parsed before a resume go first
+    for row in store.iter_run_rows(run_id):
+        sink.write(row)
 
-                driver.get(url)
-                time.sleep(6)
+    try:
+        if args.workers > 1:
+            run_worker_pool(categories, cities, filter_address, sink, args.workers,
+                            use_http=use_http, store=store, run_id=run_id)
+        else:
+            driver = create_driver(headless=args.headless)
+            fetcher = HttpCardFetcher(driver) if use_http else None
 
-                links = collect_links(driver)
-                print(f"Collected links: {len(links)}")
+            def on_card(url, row):
+                store.save_card(run_id, url, category, city, row)
 
-                if links:
-                    rows = parse_cards(driver, links, city, category, filter_address)
-                    all_rows.extend(rows)
-                else:
-                    print("No results found")
+            try:
+                for category in categories:
+                    for city in cities:
+                        links = pending_links(driver, category, city, store, run_id, repeats_to(sink))
+
+                        if links:
+                            if fetcher:
+                                fetcher.sync_from_driver(driver)
+                            for row in parse_cards(driver, links, city, category, filter_address, fetcher, on_card):
+                                sink.write(row)
+
+            finally:
+                if fetcher:
+                    print(f"HTTP pages: {fetcher.fetched} fetched, {fetcher.failed} failed")
+                    fetcher.close()
+                driver.quit()
 
     finally:
-        driver.quit()
+        sink.close()
+        store.close()
+
+    for line in page_timings.summary():
+        print(f"⏱ {line}")
+
+    if page_archive is not None:
+        print(f"Archived {page_archive.saved} pages → {page_archive.root}")
 
-    if not all_rows:
+    if not sink.count:
+        out.unlink(missing_ok=True)
         print("No data collected")
         return
 
-    date = datetime.now().strftime("%d.%m.%Y")
-
-    # Dynamic file naming
-    if len(cities) == 1:
-        filename = f"{transliterate(cities[0])}_{date}.xlsx"
+    if args.dedup:
+        print(f"Saved {sink.sink.count} organizations ({sink.count} records merged) → {out}")
     else:
-        filename = f"map_results_{date}.xlsx"
-
-    out = OUTPUT_DIR / filename
-
-    pd.DataFrame(all_rows).to_excel(out, index=False)
-
-    print(f"Saved {len(all_rows)} records → {out}")
+        print(f"Saved {sink.count} records → {out}")
 
 
 if __name__ == "__main__":